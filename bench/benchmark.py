@@ -0,0 +1,127 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from json import dump
+from os import chdir, getcwd
+from platform import python_version
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from lib.solveTSP import TSPSolver
+from lib.heuristicTSP import HeuristicTSPSolver
+from lib.events import EventEmitter, ITEM_DONE, SOLVER_IMPROVED
+from bench.mockServer import MockNaverServer
+from ropto import get_namespace, main
+
+def get_random_matrix(size: int, seed: int) -> list[list[int]]:
+    """
+    Durations drawn independently from 1 to 30 minutes.
+    """
+    random = Random(seed)
+    return [[None if i == j else random.randint(60_000, 1_800_000) for j in range(size)] for i in range(size)]
+
+def get_clustered_matrix(size: int, seed: int, clusters: int =4) -> list[list[int]]:
+    """
+    Durations between points scattered around a few centers,
+    driven at about 30 km/h with a random asymmetric detour.
+    """
+    random = Random(seed)
+    centers = [(random.uniform(0, 10_000), random.uniform(0, 10_000)) for _ in range(clusters)]
+    points = []
+    for _ in range(size):
+        x, y = random.choice(centers)
+        points.append((random.gauss(x, 800), random.gauss(y, 800)))
+    matrix = []
+    for i, (xi, yi) in enumerate(points):
+        row = []
+        for j, (xj, yj) in enumerate(points):
+            distance = ((xi - xj)**2 + (yi - yj)**2)**0.5
+            row.append(None if i == j else round(distance*random.uniform(1.2, 1.5)/8.3*1000) + 30_000)
+        matrix.append(row)
+    return matrix
+
+def benchmark_solvers(sizes: list[int], exact_limit: int, time_limit: float, seed: int) -> list[dict]:
+    """
+    Solve generated matrices with each engine.
+
+    The heuristic engine always runs until time_limit, so best_seconds
+    is when it found its final route, and gap is how far that route is
+    from the exact one when the exact engine ran too.
+    """
+    results = []
+    for size in sizes:
+        for kind, get_matrix in (("random", get_random_matrix), ("clustered", get_clustered_matrix)):
+            matrix = get_matrix(size, seed)
+            # seconds since the start of the solve of the last route found
+            found = []
+            def record(event) -> None:
+                if event.kind == SOLVER_IMPROVED or (event.kind == ITEM_DONE and not found):
+                    found[:] = [perf_counter() - started]
+            solvers = [HeuristicTSPSolver(time_limit=time_limit, seed=seed, events=EventEmitter(record))]
+            if size <= exact_limit:
+                solvers.insert(0, TSPSolver())
+            exact = {}
+            for solver in solvers:
+                for no_return in (False, True):
+                    found.clear()
+                    started = perf_counter()
+                    solution = solver.solve(matrix, no_return)
+                    seconds = perf_counter() - started
+                    if isinstance(solver, TSPSolver):
+                        exact[no_return] = solution.duration
+                    results.append({
+                        "engine": solver.name, "matrix": kind, "size": size, "no_return": no_return,
+                        "seconds": seconds, "best_seconds": found[0] if found else seconds, "duration": solution.duration,
+                        "gap": solution.duration/exact[no_return] - 1 if no_return in exact else None
+                    })
+                    gap = "" if results[-1]["gap"] is None else f"{results[-1]['gap']:>8.2%}"
+                    print(f"{solver.name:<28}{kind:<10}{size:>5}{' open' if no_return else ' closed':<8}{results[-1]['seconds']:>10.3f}s{results[-1]['best_seconds']:>10.3f}s{gap}")
+    return results
+
+def benchmark_pipeline(sizes: list[int], latency: float, error_rate: float, workers: list[int], seed: int) -> list[dict]:
+    """
+    Run ropto.main end to end against MockNaverServer.
+    """
+    results = []
+    directory = getcwd()
+    for size in sizes:
+        for worker_count in workers:
+            with TemporaryDirectory() as temporary, MockNaverServer(latency=latency, error_rate=error_rate, seed=seed) as server:
+                chdir(temporary)
+                try:
+                    with open("addr.txt", "w", encoding="UTF-8") as file:
+                        file.write("\n".join(f"벤치마크로 {i}" for i in range(1, size)))
+                    namespace = get_namespace(["--api-url", server.url, "--no-cache", "-w", str(worker_count), "--rate-limit", "0", "-t", "1"])
+                    started = perf_counter()
+                    main(namespace, "benchmark")
+                    seconds = perf_counter() - started
+                finally:
+                    chdir(directory)
+                results.append({
+                    "size": size, "workers": worker_count, "latency": latency, "error_rate": error_rate,
+                    "seconds": seconds, "requests": server.requests, "errors": server.errors, "bytes": server.bytes_sent
+                })
+                print(f"{'pipeline':<28}{worker_count:>3} workers{size:>5}{seconds:>14.3f}s{server.requests:>7} requests")
+    return results
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="ROPTO benchmarks. Run from the repository root as 'python -m bench.benchmark'.")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="write results to this file as JSON (default: bench_results.json)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated matrices and failures (default: 0)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 12, 16, 50, 100], help="numbers of points to solve (default: 8 12 16 50 100)")
+    parser.add_argument("--exact-limit", type=int, default=16, help="solve exactly up to this number of points (default: 16)")
+    parser.add_argument("--time-limit", type=float, default=1, help="time budget of the heuristic engine (default: 1)")
+    parser.add_argument("--pipeline-sizes", type=int, nargs="*", default=[10, 20], help="numbers of addresses to run end to end (default: 10 20)")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the mock server waits per request (default: 0.02)")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="ratio of requests the mock server fails (default: 0.01)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="worker counts to run end to end with (default: 1 8)")
+    namespace = parser.parse_args()
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": python_version(),
+        "seed": namespace.seed,
+        "solver": benchmark_solvers(namespace.sizes, namespace.exact_limit, namespace.time_limit, namespace.seed),
+        "pipeline": benchmark_pipeline(namespace.pipeline_sizes, namespace.latency, namespace.error_rate, namespace.workers, namespace.seed)
+    }
+    with open(namespace.output, "w", encoding="UTF-8") as file:
+        dump(report, file, indent=2, ensure_ascii=False)
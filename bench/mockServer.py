@@ -0,0 +1,107 @@
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from random import Random
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+from lib.utils import get_distance
+
+# around Wonju city hall
+CENTER_LONGITUDE = 127.92
+CENTER_LATITUDE = 37.34
+
+class MockNaverServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the geocoding and driving endpoints of Naver API.
+
+    Every address is placed deterministically near CENTER by its hash,
+    and a driving duration is the great-circle distance at about
+    30 km/h with a direction dependent detour. Each request waits
+    latency seconds and fails with 503 at error_rate.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int =0, latency: float =0, error_rate: float =0, seed: int =0):
+        super().__init__(("127.0.0.1", port), MockNaverHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = Random(seed)
+        self.lock = Lock()
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+    def __enter__(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+    def __exit__(self, type, value, traceback) -> None:
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+
+def get_mock_coordinate(address: str) -> str:
+    digest = sha256(" ".join(address.split()).encode()).digest()
+    longitude = CENTER_LONGITUDE + (int.from_bytes(digest[:4], "big")/2**32 - 0.5)*0.1
+    latitude = CENTER_LATITUDE + (int.from_bytes(digest[4:8], "big")/2**32 - 0.5)*0.08
+    return f"{longitude:.7f},{latitude:.7f}"
+
+class MockNaverHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        sleep(self.server.latency)
+        if self.server.should_fail():
+            return self.send_json(503, {"error": {"errorCode": "503", "message": "mock failure"}})
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path.endswith("/map-geocode/v2/geocode"):
+            return self.send_geocode(query.get("query", ""))
+        if url.path.endswith("/map-direction/v1/driving"):
+            return self.send_direction(query["start"], query["goal"])
+        self.send_json(404, {"error": {"errorCode": "404", "message": "not found"}})
+
+    def send_geocode(self, address: str) -> None:
+        if not address.strip():
+            return self.send_json(200, {"status": "OK", "meta": {"totalCount": 0}, "addresses": []})
+        x, y = get_mock_coordinate(address).split(",")
+        geocode = {"roadAddress": "강원도 원주시 " + " ".join(address.split()), "jibunAddress": "", "x": x, "y": y}
+        self.send_json(200, {"status": "OK", "meta": {"totalCount": 1}, "addresses": [geocode]})
+
+    def send_direction(self, start: str, goal: str) -> None:
+        distance = get_distance(start, goal)
+        detour = 1.2 + int(sha256(f"{start}>{goal}".encode()).hexdigest()[:4], 16)/65536*0.2
+        duration = round(distance*detour/8.3*1000)
+        path = [[float(value) for value in start.split(",")], [float(value) for value in goal.split(",")]]
+        route = {"summary": {"distance": round(distance*detour), "duration": duration}, "path": path, "guide": []}
+        self.send_json(200, {"code": 0, "message": "길찾기를 성공하였습니다.", "route": {"traoptimal": [route]}})
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.server.lock:
+            self.server.bytes_sent += len(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+if __name__ == "__main__":
+    server = MockNaverServer(port=8000)
+    print(f"Serving mock Naver API on {server.url}")
+    server.serve_forever()
@@ -1,4 +1,37 @@
 API_ID = "vcx9d5ovg5"
 DEFAULT_START_ADDRESS = "지니기길 11-20"
 TOTAL_OUTPUT_LENGTH_VERBOSE_2 = 60
-OUTPUT_COMPLETE_INDICATOR = "Complete"
\ No newline at end of file
+OUTPUT_COMPLETE_INDICATOR = "Complete"
+EXACT_SOLVER_LIMIT = 18
+HEURISTIC_TIME_LIMIT = 10
+HEURISTIC_EXACT_LIMIT = 12
+NEIGHBOUR_LIST_SIZE = 8
+API_URL = "https://naveropenapi.apigw.ntruss.com"
+DEFAULT_WORKERS = 8
+DEFAULT_RATE_LIMIT = 20
+CACHE_FILE = "ropto_cache.db"
+CACHE_TTL_DAYS = 30
+CACHE_MAX_ENTRIES = 200_000
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+CHECKPOINT_DIR = ".ropto_checkpoints"
+CHECKPOINT_INTERVAL = 20
+ESTIMATE_MS_PER_METER = 156
+SYMMETRIC_TOLERANCE = 0.02
+CANCEL_POLL_INTERVAL = 0.1
+EVENT_THROTTLE_INTERVAL = 0.1
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+BATCH_OUTPUT_SUFFIX = ".result.txt"
+CLUSTER_SIZE = 15
+BOUNDARY_CANDIDATES = 3
+KMEANS_ITERATIONS = 30
+CLUSTER_ORDER_TIME_LIMIT = 1
+EXACT_TABLE_LIMIT = 4*2**30
+PARALLEL_TABLE_LIMIT = 4*2**30
+UPPER_BOUND_TIME_RATIO = 0.1
+CITY_PREFIXES = ["강원특별자치도", "강원도", "원주시"]
+PREVIEW_TIME_LIMIT = 1
+PROGRESSIVE_BATCH_SIZE = 200
\ No newline at end of file
@@ -0,0 +1,199 @@
+from time import monotonic
+from lib.solveTSP import Route
+from lib.heuristicTSP import HeuristicTSPSolver
+from lib.utils import RunCancelledError
+from lib.events import EventEmitter, STAGE_START, STAGE_END, ITEM_DONE, SOLVER_IMPROVED, get_emitter
+from config import HEURISTIC_TIME_LIMIT, UPPER_BOUND_TIME_RATIO
+
+# cost of an arc a node forbids, larger than any route
+FORBIDDEN = 2**50
+
+def solve_assignment(costs: list[list[int]]) -> tuple[int, list[int]]:
+    """
+    Hungarian algorithm with potentials in O(n^3).
+
+    It returns the least total cost of assigning each row to a distinct
+    column and the column of each row.
+    """
+    size = len(costs)
+    u = [0]*(size + 1)
+    v = [0]*(size + 1)
+    # row matched to each column, 1-based with 0 as the column being added
+    matched = [0]*(size + 1)
+    way = [0]*(size + 1)
+    for i in range(1, size + 1):
+        matched[0] = i
+        column = 0
+        minimum = [float("inf")]*(size + 1)
+        used = [False]*(size + 1)
+        while True:
+            used[column] = True
+            row = matched[column]
+            row_costs = costs[row - 1]
+            row_potential = u[row]
+            delta = float("inf")
+            next_column = 0
+            for j in range(1, size + 1):
+                if not used[j]:
+                    reduced = row_costs[j - 1] - row_potential - v[j]
+                    if reduced < minimum[j]:
+                        minimum[j] = reduced
+                        way[j] = column
+                    if minimum[j] < delta:
+                        delta = minimum[j]
+                        next_column = j
+            for j in range(size + 1):
+                if used[j]:
+                    u[matched[j]] += delta
+                    v[j] -= delta
+                else:
+                    minimum[j] -= delta
+            column = next_column
+            if not matched[column]:
+                break
+        while column:
+            previous_column = way[column]
+            matched[column] = matched[previous_column]
+            column = previous_column
+    assignment = [0]*size
+    for j in range(1, size + 1):
+        assignment[matched[j] - 1] = j - 1
+    return sum(costs[i][assignment[i]] for i in range(size)), assignment
+
+def get_cycles(assignment: list[int]) -> list[list[int]]:
+    cycles = []
+    seen = set()
+    for start in range(len(assignment)):
+        if start in seen:
+            continue
+        cycle = [start]
+        seen.add(start)
+        point = assignment[start]
+        while point != start:
+            cycle.append(point)
+            seen.add(point)
+            point = assignment[point]
+        cycles.append(cycle)
+    return cycles
+
+class BranchBoundTSPSolver:
+    """
+    Exact solver for asymmetric TSP by branch and bound.
+
+    The lower bound of a node is the assignment problem relaxation,
+    which is a set of cycles covering every point. A node whose cycles
+    form one tour is solved. Otherwise the shortest cycle is broken by
+    forbidding each of its free arcs in turn while requiring the arcs
+    before it (Carpaneto and Toth). Nodes are searched depth first, so
+    memory stays within a few nodes per level, and pruned against the
+    best route, which starts from HeuristicTSPSolver.
+
+    Open routes and routes with a fixed end are closed tours in which
+    the way back to the point 0 is free, from the end only if fixed.
+    When time_limit (in seconds) runs out, the best route is returned
+    and gap is how far from optimal it may be at most. Its name then
+    tells the gap.
+    """
+    name = "branch-and-bound (exact)"
+
+    def __init__(self, verbose: int =1, time_limit: float =HEURISTIC_TIME_LIMIT, events: EventEmitter =None, cancel=None):
+        self.verbose = verbose
+        self.events = get_emitter(verbose, events)
+        self.cancel = cancel
+        self.time_limit = time_limit
+
+    def solve(self, duration_matrix: list[list[int]], no_return: bool, end: int =None) -> Route:
+        # a gap of an earlier solve must not name this one
+        self.name = BranchBoundTSPSolver.name
+        self.events.emit(STAGE_START, "solve", engine=self.name)
+        started = monotonic()
+        deadline = started + self.time_limit
+        self.duration_matrix = duration_matrix
+        size = len(duration_matrix)
+        if size == 1:
+            self.gap = 0
+            self.events.emit(STAGE_END, "solve", engine=self.name, duration=0, nodes=0, gap=0)
+            return Route([0], 0)
+        self.closed = end == 0 or (end is None and not no_return)
+        self.end = end
+        self.set_costs()
+
+        heuristic = HeuristicTSPSolver(time_limit=self.time_limit*UPPER_BOUND_TIME_RATIO, seed=0, cancel=self.cancel)
+        best = heuristic.solve(duration_matrix, no_return, end)
+        upper_bound = best.duration
+        self.events.emit(SOLVER_IMPROVED, "solve", duration=upper_bound)
+
+        self.nodes = 0
+        # each node is (lower bound of its parent, required arcs, forbidden arcs)
+        stack = [(0, (), ())]
+        lower_bound = None
+        while stack:
+            if monotonic() >= deadline:
+                lower_bound = min(node[0] for node in stack)
+                break
+            if self.cancel and self.cancel.is_set():
+                raise RunCancelledError("계산이 취소되었습니다.")
+            parent_bound, required, forbidden = stack.pop()
+            if parent_bound >= upper_bound:
+                continue
+            self.nodes += 1
+            self.events.emit(ITEM_DONE, "solve", round((monotonic() - started)*1000), round(self.time_limit*1000))
+            bound, assignment = solve_assignment(self.get_node_costs(required, forbidden))
+            if bound >= upper_bound:
+                continue
+            cycles = get_cycles(assignment)
+            if len(cycles) == 1:
+                upper_bound = bound
+                best = self.to_route(assignment)
+                self.events.emit(SOLVER_IMPROVED, "solve", duration=upper_bound)
+                continue
+            required_set = set(required)
+            cycle = min(cycles, key=lambda cycle: sum((point, assignment[point]) not in required_set for point in cycle))
+            arcs = [(point, assignment[point]) for point in cycle if (point, assignment[point]) not in required_set]
+            children = []
+            for index, arc in enumerate(arcs):
+                children.append((bound, required + tuple(arcs[:index]), forbidden + (arc,)))
+            # the child forbidding the first arc is searched first
+            stack.extend(reversed(children))
+
+        self.gap = 0 if lower_bound is None else max(0, upper_bound - lower_bound)/upper_bound if upper_bound else 0
+        if self.gap:
+            self.name = f"{BranchBoundTSPSolver.name}, 최적해와 최대 {self.gap:.1%} 차이"
+        self.events.emit(STAGE_END, "solve", engine=self.name, duration=best.duration, nodes=self.nodes, lower_bound=lower_bound if lower_bound is not None else upper_bound, gap=self.gap)
+        return best
+
+    def set_costs(self) -> None:
+        """
+        Costs of a closed tour, with the way back to the point 0 set by the mode.
+        """
+        matrix = self.duration_matrix
+        size = len(matrix)
+        self.costs = [[FORBIDDEN if i == j else matrix[i][j] for j in range(size)] for i in range(size)]
+        if self.closed:
+            return
+        for i in range(1, size):
+            self.costs[i][0] = 0 if self.end is None or i == self.end else FORBIDDEN
+
+    def get_node_costs(self, required: tuple, forbidden: tuple) -> list[list[int]]:
+        costs = [row[:] for row in self.costs]
+        for i, j in forbidden:
+            costs[i][j] = FORBIDDEN
+        for i, j in required:
+            for k in range(len(costs)):
+                if k != j:
+                    costs[i][k] = FORBIDDEN
+                if k != i:
+                    costs[k][j] = FORBIDDEN
+        return costs
+
+    def to_route(self, assignment: list[int]) -> Route:
+        points = [0]
+        while assignment[points[-1]] != 0:
+            points.append(assignment[points[-1]])
+        if self.closed:
+            points.append(0)
+        return Route(points, sum(self.duration_matrix[i][j] for i, j in zip(points, points[1:])))
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,92 @@
+from json import dumps, loads
+from sqlite3 import connect
+from threading import Lock
+from time import time
+from config import CACHE_FILE, CACHE_TTL_DAYS, CACHE_MAX_ENTRIES
+
+class RoptoCache:
+    """
+    Persistent cache of geocodes and durations in a single SQLite file.
+
+    Geocodes are keyed by normalized address, durations by
+    (start coordinate, goal coordinate) and solved routes by a key
+    of their matrix and solver options. Entries older than ttl_days
+    are ignored and dropped, and each table is trimmed to max_entries
+    by evicting the least recently used entries.
+    It is safe to share between the workers of NaverOpenAPI.
+    """
+    def __init__(self, path: str =CACHE_FILE, ttl_days: float =CACHE_TTL_DAYS, max_entries: int =CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl_days*86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        self.connection = connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS geocodes (address TEXT PRIMARY KEY, geocode TEXT, created REAL, used REAL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS durations (start TEXT, goal TEXT, duration INTEGER, created REAL, used REAL, PRIMARY KEY (start, goal))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, points TEXT, duration INTEGER, engine TEXT, created REAL, used REAL)")
+        self.connection.commit()
+
+    def get_geocode(self, address: str) -> dict:
+        with self.lock:
+            row = self.connection.execute("SELECT geocode FROM geocodes WHERE address = ? AND created > ?", (address, time() - self.ttl)).fetchone()
+            self.count(row, "geocodes", "address = ?", (address,))
+        return loads(row[0]) if row else None
+    def set_geocode(self, address: str, geocode: dict) -> None:
+        now = time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)", (address, dumps(geocode, ensure_ascii=False), now, now))
+
+    def get_duration(self, start: str, goal: str) -> int:
+        with self.lock:
+            row = self.connection.execute("SELECT duration FROM durations WHERE start = ? AND goal = ? AND created > ?", (start, goal, time() - self.ttl)).fetchone()
+            self.count(row, "durations", "start = ? AND goal = ?", (start, goal))
+        return row[0] if row else None
+    def set_duration(self, start: str, goal: str, duration: int) -> None:
+        now = time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO durations VALUES (?, ?, ?, ?, ?)", (start, goal, duration, now, now))
+
+    def get_solution(self, key: str) -> tuple[list[int], int, str]:
+        """
+        Points, duration and engine name of the route solved for key.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT points, duration, engine FROM solutions WHERE key = ? AND created > ?", (key, time() - self.ttl)).fetchone()
+            self.count(row, "solutions", "key = ?", (key,))
+        return (loads(row[0]), row[1], row[2]) if row else None
+    def set_solution(self, key: str, points: list[int], duration: int, engine: str) -> None:
+        now = time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?)", (key, dumps(points), duration, engine, now, now))
+            self.connection.commit()
+
+    def count(self, row: tuple, table: str, condition: str, parameters: tuple) -> None:
+        if row:
+            self.hits += 1
+            self.connection.execute(f"UPDATE {table} SET used = ? WHERE {condition}", (time(),) + parameters)
+        else:
+            self.misses += 1
+
+    def flush(self) -> None:
+        with self.lock:
+            self.connection.commit()
+
+    def evict(self) -> None:
+        """
+        Drop expired entries and the least recently used ones over max_entries.
+        """
+        with self.lock:
+            for table in ("geocodes", "durations", "solutions"):
+                self.connection.execute(f"DELETE FROM {table} WHERE created <= ?", (time() - self.ttl,))
+                self.connection.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self.connection.commit()
+
+    def close(self) -> None:
+        self.evict()
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,81 @@
+from hashlib import sha256
+from json import dump, load
+from os import makedirs, remove, replace
+from os.path import exists, join
+from threading import Lock
+from config import CHECKPOINT_DIR, CHECKPOINT_INTERVAL
+
+class MatrixCheckpoint:
+    """
+    Partially built duration matrix saved on disk.
+
+    The file is named after the hash of the coordinates, so a rerun on
+    the same inputs finds it and only requests the missing cells.
+    New cells are appended to a log beside it, flushed every interval
+    cells, and save compacts the log into the file. Both are removed
+    when the matrix is complete.
+    """
+    def __init__(self, coordinates: list[str], directory: str =CHECKPOINT_DIR, interval: int =CHECKPOINT_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.path = join(directory, sha256("\n".join(coordinates).encode()).hexdigest() + ".json")
+        self.log_path = self.path + ".log"
+        self.lock = Lock()
+        self.unsaved = 0
+        self.log = None
+        self.durations: dict[str, int] = {}
+        if exists(self.path):
+            with open(self.path, "r") as file:
+                self.durations = load(file)
+        if exists(self.log_path):
+            with open(self.log_path, "r") as file:
+                for line in file:
+                    # the last line may be cut short by an interrupted run
+                    if line.endswith("\n"):
+                        cell, _, duration = line.rpartition(",")
+                        self.durations[cell] = int(duration)
+
+    def get(self, i: int, j: int) -> int:
+        return self.durations.get(f"{i},{j}")
+    def add(self, i: int, j: int, duration: int) -> None:
+        with self.lock:
+            self.durations[f"{i},{j}"] = duration
+            if self.log is None:
+                makedirs(self.directory, exist_ok=True)
+                self.log = open(self.log_path, "a")
+            self.log.write(f"{i},{j},{duration}\n")
+            self.unsaved += 1
+            if self.unsaved >= self.interval:
+                self.log.flush()
+                self.unsaved = 0
+
+    def save(self) -> None:
+        """
+        Compact the log into the checkpoint file.
+        """
+        with self.lock:
+            self.close_log()
+            if not exists(self.log_path):
+                return
+            # write aside first so that an interrupted write never corrupts it
+            with open(self.path + ".tmp", "w") as file:
+                dump(self.durations, file)
+            replace(self.path + ".tmp", self.path)
+            remove(self.log_path)
+
+    def discard(self) -> None:
+        with self.lock:
+            self.close_log()
+            for path in (self.path, self.log_path):
+                if exists(path):
+                    remove(path)
+
+    def close_log(self) -> None:
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        self.unsaved = 0
+
+
+if __name__ == "__main__":
+    pass
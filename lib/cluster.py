@@ -0,0 +1,94 @@
+from heapq import nsmallest
+from math import cos, radians
+from random import Random
+from lib.solveTSP import TSPSolver
+from lib.heuristicTSP import HeuristicTSPSolver
+from lib.matrix import DurationMatrix
+from lib.utils import get_distance
+from config import EXACT_SOLVER_LIMIT, KMEANS_ITERATIONS, CLUSTER_ORDER_TIME_LIMIT
+
+def get_positions(coordinates: list[str]) -> list[tuple[float, float]]:
+    """
+    Coordinates projected to meters, good enough within a city.
+    """
+    longitudes, latitudes = zip(*(map(float, coordinate.split(",")) for coordinate in coordinates))
+    scale = cos(radians(sum(latitudes)/len(latitudes)))
+    return [(longitude*111_320*scale, latitude*110_574) for longitude, latitude in zip(longitudes, latitudes)]
+
+def get_clusters(coordinates: list[str], points: list[int], count: int, seed: int =0, limit: int =None) -> list[list[int]]:
+    """
+    Split points into up to count clusters of nearby coordinates by k-means.
+
+    Centers start from k-means++ seeding, so the result only depends on seed.
+    Empty clusters are dropped. With limit, clusters of more points are
+    split again, so there may be more than count of them.
+    """
+    if not points:
+        return []
+    random = Random(seed)
+    positions = get_positions([coordinates[point] for point in points])
+    def get_square(a: tuple[float, float], b: tuple[float, float]) -> float:
+        return (a[0] - b[0])**2 + (a[1] - b[1])**2
+    centers = [positions[random.randrange(len(positions))]]
+    while len(centers) < min(count, len(positions)):
+        weights = [min(get_square(position, center) for center in centers) for position in positions]
+        if not any(weights):
+            break
+        centers.append(random.choices(positions, weights)[0])
+    assignments = None
+    for _ in range(KMEANS_ITERATIONS):
+        new_assignments = [min(range(len(centers)), key=lambda k: get_square(position, centers[k])) for position in positions]
+        if new_assignments == assignments:
+            break
+        assignments = new_assignments
+        for k in range(len(centers)):
+            members = [position for position, assignment in zip(positions, assignments) if assignment == k]
+            if members:
+                centers[k] = (sum(x for x, _ in members)/len(members), sum(y for _, y in members)/len(members))
+    clusters = [[] for _ in centers]
+    for point, assignment in zip(points, assignments):
+        clusters[assignment].append(point)
+    clusters = [cluster for cluster in clusters if cluster]
+    if limit is None:
+        return clusters
+    bounded = []
+    for cluster in clusters:
+        if len(cluster) <= limit:
+            bounded.append(cluster)
+            continue
+        parts = get_clusters(coordinates, cluster, -(-len(cluster)//limit), seed, limit) if len(clusters) > 1 else [cluster]
+        if len(parts) == 1:
+            # k-means cannot separate them, so they are cut along the longer axis
+            positions = dict(zip(cluster, get_positions([coordinates[point] for point in cluster])))
+            axis = max((0, 1), key=lambda k: max(position[k] for position in positions.values()) - min(position[k] for position in positions.values()))
+            cluster = sorted(cluster, key=lambda point: positions[point][axis])
+            parts = [cluster[k:k + limit] for k in range(0, len(cluster), limit)]
+        bounded.extend(parts)
+    return bounded
+
+def get_centroid(coordinates: list[str], points: list[int]) -> str:
+    longitudes, latitudes = zip(*(map(float, coordinates[point].split(",")) for point in points))
+    return f"{sum(longitudes)/len(longitudes):.7f},{sum(latitudes)/len(latitudes):.7f}"
+
+def get_candidates(coordinates: list[str], points: list[int], target: str, count: int) -> list[int]:
+    """
+    count points nearest to target, where a route may leave or enter the cluster.
+    """
+    return nsmallest(count, points, key=lambda point: get_distance(coordinates[point], target))
+
+def get_cluster_order(centroids: list[str], no_return: bool, end: int =None) -> list[int]:
+    """
+    Order of clusters from the cluster 0 by great-circle distances between centroids.
+    """
+    size = len(centroids)
+    matrix = DurationMatrix(size)
+    for i in range(size):
+        for j in range(size):
+            if i != j:
+                matrix.set(i, j, round(get_distance(centroids[i], centroids[j])))
+    solver = TSPSolver() if size <= EXACT_SOLVER_LIMIT else HeuristicTSPSolver(time_limit=CLUSTER_ORDER_TIME_LIMIT, seed=0)
+    return solver.solve(matrix, no_return, end).points
+
+
+if __name__ == "__main__":
+    pass
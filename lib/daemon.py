@@ -0,0 +1,92 @@
+from http.client import HTTPConnection, HTTPException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from threading import Lock
+from lib.utils import RoptoError
+from config import DAEMON_HOST, DAEMON_PORT
+
+class DaemonError(RoptoError):
+    pass
+
+class RoptoDaemon(ThreadingHTTPServer):
+    """
+    Local HTTP/JSON service solving route requests with warm state.
+
+    solve takes a request, a dict with the address file as "text" and
+    route options as "options", and returns the formatted result.
+    Whatever solve keeps between calls, such as the unlocked api key,
+    open connections and caches, stays warm for the next request.
+    Requests are solved one at a time and share the rate limit.
+
+    POST /route solves a request and GET /status tells how many were
+    served. It listens on the loopback interface only.
+    """
+    daemon_threads = True
+
+    def __init__(self, solve, port: int =DAEMON_PORT, host: str =DAEMON_HOST):
+        super().__init__((host, port), RoptoDaemonHandler)
+        self.solve = solve
+        self.lock = Lock()
+        self.served = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+class RoptoDaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        if self.path != "/status":
+            return self.send_json(404, {"error": {"type": "NotFound", "message": self.path}})
+        self.send_json(200, {"status": "OK", "served": self.server.served})
+
+    def do_POST(self) -> None:
+        if self.path != "/route":
+            return self.send_json(404, {"error": {"type": "NotFound", "message": self.path}})
+        try:
+            request = loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            with self.server.lock:
+                output = self.server.solve(request)
+                self.server.served += 1
+        except RoptoError as err:
+            return self.send_json(422, {"error": {"type": err.__class__.__name__, "message": err.args[0] if err.args else ""}})
+        except Exception as err:
+            return self.send_json(500, {"error": {"type": err.__class__.__name__, "message": str(err)}})
+        self.send_json(200, {"output": output})
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+def request_route(request: dict, port: int =DAEMON_PORT, host: str =DAEMON_HOST) -> str:
+    """
+    Send request to a running RoptoDaemon and return the formatted result.
+    """
+    conn = HTTPConnection(host, port)
+    try:
+        payload = dumps(request, ensure_ascii=False).encode()
+        conn.request("POST", "/route", payload, {"Content-Type": "application/json; charset=utf-8"})
+        response = conn.getresponse()
+        body = loads(response.read())
+    except ConnectionRefusedError:
+        raise DaemonError(f"{host}:{port}에서 실행 중인 데몬이 없습니다. 'ropto.py --serve'로 먼저 실행하세요.")
+    except (OSError, HTTPException, ValueError) as err:
+        raise DaemonError(f"데몬과 통신하지 못하였습니다. {err.__class__.__name__}: {err}")
+    finally:
+        conn.close()
+    if "error" in body:
+        raise DaemonError(f"{body['error']['type']}: {body['error']['message']}")
+    return body["output"]
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from time import monotonic
+from config import TOTAL_OUTPUT_LENGTH_VERBOSE_2, OUTPUT_COMPLETE_INDICATOR, EVENT_THROTTLE_INTERVAL
+
+STAGE_START = "stage_start"
+STAGE_END = "stage_end"
+ITEM_DONE = "item_done"
+RETRY = "retry"
+CACHE = "cache"
+SOLVER_IMPROVED = "solver_improved"
+REQUEST = "request"
+PREVIEW = "preview"
+
+# kinds that may fire for every item and are dropped when too frequent
+THROTTLED_KINDS = {ITEM_DONE, SOLVER_IMPROVED}
+
+class RoptoEvent:
+    """
+    Something that happened during a run.
+
+    Properties of RoptoEvent instance
+    * kind: One of STAGE_START, STAGE_END, ITEM_DONE, RETRY, CACHE,
+      SOLVER_IMPROVED, REQUEST and PREVIEW.
+    * stage: "geocode", "direction", "solve", "request" or any other
+      stage of ropto.main such as "read" and "dedupe".
+    * done, total: Progress of the stage.
+    * data: Details depending on kind, e.g. hits and misses of CACHE.
+    """
+    def __init__(self, kind: str, stage: str, done: int =0, total: int =0, **data):
+        self.kind = kind
+        self.stage = stage
+        self.done = done
+        self.total = total
+        self.data = data
+    def __repr__(self):
+        return f"RoptoEvent({self.kind}, {self.stage}, {self.done}/{self.total}, {self.data})"
+
+class EventEmitter:
+    """
+    Hands events to every observer, which is any callable taking a RoptoEvent.
+
+    Events of THROTTLED_KINDS are passed on at most once per interval
+    seconds for each stage, except the one which completes the stage.
+    Without observers, emitting costs next to nothing.
+    Observers may be called from worker threads.
+    """
+    def __init__(self, *observers, interval: float =EVENT_THROTTLE_INTERVAL):
+        self.observers = list(observers)
+        self.interval = interval
+        self.last_emitted: dict[tuple[str, str], float] = {}
+    def subscribe(self, observer) -> None:
+        self.observers.append(observer)
+    def unsubscribe(self, observer) -> None:
+        self.observers.remove(observer)
+
+    def emit(self, kind: str, stage: str, done: int =0, total: int =0, **data) -> None:
+        if not self.observers:
+            return
+        if kind in THROTTLED_KINDS and done != total:
+            now = monotonic()
+            if now - self.last_emitted.get((kind, stage), float("-inf")) < self.interval:
+                return
+            self.last_emitted[(kind, stage)] = now
+        event = RoptoEvent(kind, stage, done, total, **data)
+        for observer in self.observers:
+            observer(event)
+
+    @contextmanager
+    def span(self, stage: str):
+        """
+        Emit STAGE_START and STAGE_END around the block.
+        """
+        self.emit(STAGE_START, stage)
+        try:
+            yield
+        finally:
+            self.emit(STAGE_END, stage)
+
+class ConsolePrinter:
+    """
+    Observer which prints progress lines on the console.
+
+    It prints what verbose level 2 has always printed,
+    cache hits and misses from level 2 on, and previews at any level.
+    """
+    output_prefixes = {
+        "geocode": "Requesting geocodes using Naver API",
+        "direction": "Requesting directions using Naver API",
+        "solve": "Solving TSP"
+    }
+    cache_prefixes = {"geocode": "Geocode cache", "direction": "Duration cache"}
+
+    def __init__(self, verbose: int =2):
+        self.verbose = verbose
+    def __call__(self, event: RoptoEvent) -> None:
+        if event.kind == PREVIEW:
+            print("\n" + event.data["output"])
+        if event.kind == CACHE and self.verbose >= 2:
+            self.print_line(self.cache_prefixes.get(event.stage, event.stage), f"{event.data['hits']} hits, {event.data['misses']} misses", end="\n")
+        if self.verbose != 2 or event.stage not in self.output_prefixes:
+            return
+        output_prefix = self.output_prefixes[event.stage]
+        if event.kind == STAGE_START:
+            self.print_line(output_prefix, "" if event.stage == "solve" else f"0/{event.total}")
+        elif event.kind == ITEM_DONE and event.stage != "solve":
+            self.print_line(output_prefix, f"{event.done}/{event.total}")
+        elif event.kind == STAGE_END:
+            self.print_line(output_prefix, OUTPUT_COMPLETE_INDICATOR, end="\n")
+
+    def print_line(self, output_prefix: str, output_progress: str, end: str ="\r") -> None:
+        print(output_prefix + "."*(TOTAL_OUTPUT_LENGTH_VERBOSE_2 - len(output_prefix) - len(output_progress)) + output_progress, end=end)
+
+def get_emitter(verbose: int, events: EventEmitter =None) -> EventEmitter:
+    """
+    events itself if given, otherwise an emitter printing for verbose.
+    """
+    if events is not None:
+        return events
+    return EventEmitter(ConsolePrinter(verbose)) if verbose >= 2 else EventEmitter()
+
+
+if __name__ == "__main__":
+    pass
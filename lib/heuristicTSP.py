@@ -0,0 +1,236 @@
+from random import Random
+from time import monotonic
+from lib.solveTSP import Route, TSPSolver
+from lib.utils import RunCancelledError
+from lib.events import EventEmitter, STAGE_START, STAGE_END, ITEM_DONE, SOLVER_IMPROVED, get_emitter
+from config import HEURISTIC_TIME_LIMIT, NEIGHBOUR_LIST_SIZE, HEURISTIC_EXACT_LIMIT
+
+PENALTY = 2**40
+
+class HeuristicTSPSolver:
+    """
+    Heuristic solver for traveling salesman problem (TSP).
+
+    It builds a route by nearest neighbour, improves it by 2-opt and
+    Or-opt moves restricted to neighbour lists, and then keeps kicking
+    the current route with double bridges until time_limit (in seconds)
+    runs out. A kicked route replaces the current one unless it is
+    longer, and the best route found so far is what is returned.
+    Up to HEURISTIC_EXACT_LIMIT points are solved by TSPSolver,
+    which is exact and takes less than the kicks there.
+    Elapsed time out of time_limit in milliseconds and every better
+    route are emitted to events, and setting cancel raises
+    RunCancelledError.
+
+    Every mode is handled as a path from the point 0 to an extra
+    terminal point whose incoming durations depend on the mode.
+    """
+    name = "2-opt/Or-opt (heuristic)"
+
+    def __init__(self, verbose: int =1, time_limit: float =HEURISTIC_TIME_LIMIT, neighbours: int =NEIGHBOUR_LIST_SIZE, seed: int =None, events: EventEmitter =None, cancel=None):
+        self.verbose = verbose
+        self.events = get_emitter(verbose, events)
+        self.cancel = cancel
+        self.time_limit = time_limit
+        self.neighbours = neighbours
+        self.random = Random(seed)
+
+    def solve(self, duration_matrix: list[list[int]], no_return: bool, end: int =None, initial: list[int] =None) -> Route:
+        """
+        Solve TSP on duration_matrix starting from the point 0.
+
+        With initial, a previous route in points of duration_matrix,
+        it starts from that route instead of nearest neighbour. Points
+        missing from it are inserted where they cost the least.
+        """
+        if len(duration_matrix) <= HEURISTIC_EXACT_LIMIT:
+            return TSPSolver(self.verbose, self.events, self.cancel).solve(duration_matrix, no_return, end)
+        self.events.emit(STAGE_START, "solve", engine=self.name)
+        deadline = monotonic() + self.time_limit
+        self.duration_matrix = duration_matrix
+        self.set_costs(no_return, end)
+        self.moves = 0
+        self.kicks = 0
+
+        order = self.get_warm_order(initial) if initial else self.get_nearest_neighbour_order()
+        current_order = best_order = self.improve(order, deadline)
+        current_duration = best_duration = self.get_duration(best_order)
+        # double bridge needs four non-empty pieces to rearrange
+        while len(best_order) - 1 - self.fixed_tail >= 4 and monotonic() < deadline:
+            if self.cancel and self.cancel.is_set():
+                raise RunCancelledError("계산이 취소되었습니다.")
+            self.events.emit(ITEM_DONE, "solve", round((self.time_limit - deadline + monotonic())*1000), round(self.time_limit*1000))
+            order = self.improve(self.kick(current_order), deadline)
+            duration = self.get_duration(order)
+            # sideways moves let the search drift across plateaus
+            if duration <= current_duration:
+                current_order = order
+                current_duration = duration
+            if duration < best_duration:
+                best_order = order
+                best_duration = duration
+                self.events.emit(SOLVER_IMPROVED, "solve", duration=best_duration)
+        self.events.emit(STAGE_END, "solve", engine=self.name, duration=best_duration, moves=self.moves, kicks=self.kicks)
+        return self.to_route(best_order)
+
+    def set_costs(self, no_return: bool, end: int) -> None:
+        """
+        Build the cost matrix with the terminal point appended.
+        """
+        matrix = self.duration_matrix
+        size = len(matrix)
+        self.size = size
+        self.terminal = size
+        self.end = end
+        self.closed = end == 0 or (end is None and not no_return)
+        self.fixed_tail = 2 if end else 1
+        costs = []
+        for i in range(size):
+            row = [0 if i == j else matrix[i][j] for j in range(size)]
+            if self.closed:
+                row.append(row[0])
+            elif end:
+                row.append(0 if i == end else PENALTY)
+            else:
+                row.append(0)
+            costs.append(row)
+        costs.append([0]*(size + 1))
+        self.costs = costs
+
+        candidates = range(1, size)
+        self.out_neighbours = [sorted((j for j in candidates if j != i), key=costs[i].__getitem__)[:self.neighbours] for i in range(size)]
+        self.in_neighbours = [sorted((j for j in range(size) if j != i), key=lambda j: costs[j][i])[:self.neighbours] for i in range(size)]
+
+    def get_nearest_neighbour_order(self) -> list[int]:
+        costs = self.costs
+        unvisited = set(range(1, self.size))
+        if self.end:
+            unvisited.discard(self.end)
+        order = [0]
+        while unvisited:
+            row = costs[order[-1]]
+            point = min(unvisited, key=row.__getitem__)
+            unvisited.remove(point)
+            order.append(point)
+        if self.end:
+            order.append(self.end)
+        order.append(self.terminal)
+        return order
+
+    def get_warm_order(self, initial: list[int]) -> list[int]:
+        """
+        Turn a previous route into an order, inserting the missing
+        points by cheapest insertion.
+        """
+        costs = self.costs
+        seen = {0, self.end}
+        order = [0]
+        for point in initial:
+            if point not in seen and 0 < point < self.size:
+                seen.add(point)
+                order.append(point)
+        if self.end:
+            order.append(self.end)
+        order.append(self.terminal)
+        for point in range(1, self.size):
+            if point in seen:
+                continue
+            stop = len(order) - self.fixed_tail + 1
+            position = min(range(1, stop), key=lambda k: costs[order[k - 1]][point] + costs[point][order[k]] - costs[order[k - 1]][order[k]])
+            order.insert(position, point)
+        return order
+
+    def get_duration(self, order: list[int]) -> int:
+        costs = self.costs
+        return sum(costs[a][b] for a, b in zip(order, order[1:]))
+
+    def to_route(self, order: list[int]) -> Route:
+        points = order[:-1]
+        if self.closed and self.size > 1:
+            points.append(0)
+        return Route(points, self.get_duration(order))
+
+    def improve(self, order: list[int], deadline: float) -> list[int]:
+        """
+        Apply improving moves until none is left or the deadline passes.
+        """
+        while monotonic() < deadline:
+            if self.two_opt(order) or self.or_opt(order):
+                self.moves += 1
+                continue
+            break
+        return order
+
+    def two_opt(self, order: list[int]) -> bool:
+        """
+        Reverse the first segment order[i:j+1] found to shorten the route.
+
+        Durations are asymmetric, so the reversed segment is priced with
+        prefix sums of both directions along the route.
+        """
+        costs = self.costs
+        last = len(order) - 2
+        position = [0]*(self.size + 1)
+        forward = [0]*len(order)
+        backward = [0]*len(order)
+        for k, point in enumerate(order):
+            position[point] = k
+            if k:
+                forward[k] = forward[k - 1] + costs[order[k - 1]][point]
+                backward[k] = backward[k - 1] + costs[point][order[k - 1]]
+        for i in range(1, last):
+            a = order[i - 1]
+            first = order[i]
+            for point in self.out_neighbours[a]:
+                j = position[point]
+                if j <= i or j > last:
+                    continue
+                b = order[j + 1]
+                delta = costs[a][point] + costs[first][b] - costs[a][first] - costs[point][b] + (backward[j] - backward[i]) - (forward[j] - forward[i])
+                if delta < 0:
+                    order[i:j + 1] = order[j:i - 1:-1]
+                    return True
+        return False
+
+    def or_opt(self, order: list[int]) -> bool:
+        """
+        Move the first segment of up to three points found to shorten
+        the route right after one of its in-neighbours.
+        """
+        costs = self.costs
+        last = len(order) - 1 - self.fixed_tail
+        position = [0]*(self.size + 1)
+        for k, point in enumerate(order):
+            position[point] = k
+        for length in range(1, 4):
+            for i in range(1, last - length + 2):
+                p = order[i - 1]
+                head = order[i]
+                tail = order[i + length - 1]
+                q = order[i + length]
+                removal = costs[p][head] + costs[tail][q] - costs[p][q]
+                for u in self.in_neighbours[head]:
+                    k = position[u]
+                    if i - 1 <= k < i + length or k > last:
+                        continue
+                    v = order[k + 1]
+                    if costs[u][head] + costs[tail][v] - costs[u][v] < removal:
+                        segment = order[i:i + length]
+                        del order[i:i + length]
+                        k = k if k < i else k - length
+                        order[k + 1:k + 1] = segment
+                        return True
+        return False
+
+    def kick(self, order: list[int]) -> list[int]:
+        """
+        Double bridge perturbation of the movable part of the route.
+        """
+        self.kicks += 1
+        stop = len(order) - self.fixed_tail
+        a, b, c = sorted(self.random.sample(range(2, stop), 3))
+        return order[:1] + order[b:c] + order[a:b] + order[1:a] + order[c:]
+
+
+if __name__ == "__main__":
+    pass
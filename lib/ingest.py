@@ -0,0 +1,82 @@
+from typing import Iterable
+from lib.utils import RoptoError, normalize_address, get_coordinate
+from config import DEFAULT_START_ADDRESS, CITY_PREFIXES
+
+class NoAddressError(RoptoError):
+    pass
+
+def get_address_key(address: str) -> str:
+    """
+    normalize_address without the leading CITY_PREFIXES,
+    so "원주시 지니기길 11-20" and "지니기길 11-20" are the same.
+    """
+    words = normalize_address(address).split(" ")
+    while len(words) > 1 and words[0] in CITY_PREFIXES:
+        words.pop(0)
+    return " ".join(words)
+
+class Ingestion:
+    """
+    Addresses of an address file, deduplicated before and after geocoding.
+
+    lines are read one at a time, so a file object streams. Blank lines
+    are dropped and lines with the same get_address_key are collapsed
+    into one address to geocode, the first of them. After group_stops,
+    addresses at the same coordinate are one stop. Lines are numbered
+    from 1, and the default start address is the line 0.
+
+    Properties of Ingestion instance
+    * addresses: Addresses to geocode, the start address first.
+    * address_of_line: Index of the address of each non-blank line.
+    * geocodes, coordinates: Those of each stop, after group_stops.
+    * stop_of_address: Index of the stop of each address, after group_stops.
+    """
+    def __init__(self, lines: Iterable[str], set_start: bool):
+        self.addresses: list[str] = []
+        self.address_of_line: dict[int, int] = {}
+        address_of_key: dict[str, int] = {}
+        if not set_start:
+            self.add_line(0, DEFAULT_START_ADDRESS, address_of_key)
+        for line_number, line in enumerate(lines, 1):
+            self.add_line(line_number, line, address_of_key)
+        if not self.addresses:
+            raise NoAddressError("주소 파일에 주소가 없습니다.")
+        self.geocodes: list[dict] = []
+        self.coordinates: list[str] = []
+        self.stop_of_address: list[int] = []
+
+    def add_line(self, line_number: int, line: str, address_of_key: dict[str, int]) -> None:
+        address = normalize_address(line)
+        if not address:
+            return
+        key = get_address_key(address)
+        if key not in address_of_key:
+            address_of_key[key] = len(self.addresses)
+            self.addresses.append(address)
+        self.address_of_line[line_number] = address_of_key[key]
+
+    def group_stops(self, geocodes: list[dict]) -> None:
+        """
+        Group addresses by the coordinates of their geocodes,
+        keeping the first address of each coordinate.
+        """
+        stop_of_coordinate: dict[str, int] = {}
+        self.geocodes = []
+        self.stop_of_address = []
+        for geocode in geocodes:
+            coordinate = get_coordinate(geocode)
+            if coordinate not in stop_of_coordinate:
+                stop_of_coordinate[coordinate] = len(self.geocodes)
+                self.geocodes.append(geocode)
+            self.stop_of_address.append(stop_of_coordinate[coordinate])
+        self.coordinates = list(stop_of_coordinate)
+
+    def get_stop(self, line_number: int) -> int:
+        return self.stop_of_address[self.address_of_line[line_number]]
+
+    def get_last_stop(self) -> int:
+        return self.get_stop(max(self.address_of_line))
+
+
+if __name__ == "__main__":
+    pass
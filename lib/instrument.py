@@ -0,0 +1,78 @@
+from bisect import bisect_left
+from datetime import datetime
+from json import dump
+from threading import Lock
+from time import perf_counter
+from lib.events import RoptoEvent, STAGE_START, STAGE_END, RETRY, CACHE, REQUEST
+from config import LATENCY_BUCKETS_MS
+
+class RunReport:
+    """
+    Observer which measures a run from its events.
+
+    It keeps the time spent in each stage, counts of requests by
+    endpoint and status with a latency histogram and received bytes,
+    retries, cache hits and misses and what the solver reported
+    when it finished. Latency buckets are upper bounds in milliseconds
+    with one more bucket for anything slower.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.started = perf_counter()
+        self.created = datetime.now().isoformat(timespec="seconds")
+        self.stage_started: dict[str, float] = {}
+        self.stages: dict[str, dict] = {}
+        self.requests: dict[str, dict] = {}
+        self.retries = 0
+        self.cache: dict[str, dict] = {}
+        self.solver: list[dict] = []
+
+    def __call__(self, event: RoptoEvent) -> None:
+        # requests are reported from the worker threads
+        with self.lock:
+            self.record(event)
+
+    def record(self, event: RoptoEvent) -> None:
+        if event.kind == STAGE_START:
+            self.stage_started[event.stage] = perf_counter()
+        elif event.kind == STAGE_END:
+            stage = self.stages.setdefault(event.stage, {"seconds": 0, "count": 0, "items": 0})
+            stage["seconds"] += perf_counter() - self.stage_started.pop(event.stage, perf_counter())
+            stage["count"] += 1
+            stage["items"] += event.done
+            if event.stage == "solve":
+                self.solver.append(event.data)
+        elif event.kind == REQUEST:
+            endpoint = self.requests.setdefault(event.data["endpoint"], {"count": 0, "statuses": {}, "bytes": 0, "seconds": 0, "latency_ms": [0]*(len(LATENCY_BUCKETS_MS) + 1)})
+            endpoint["count"] += 1
+            status = str(event.data["status"])
+            endpoint["statuses"][status] = endpoint["statuses"].get(status, 0) + 1
+            endpoint["bytes"] += event.data["bytes"]
+            endpoint["seconds"] += event.data["latency"]
+            endpoint["latency_ms"][bisect_left(LATENCY_BUCKETS_MS, event.data["latency"]*1000)] += 1
+        elif event.kind == RETRY:
+            self.retries += 1
+        elif event.kind == CACHE:
+            cache = self.cache.setdefault(event.stage, {"hits": 0, "misses": 0})
+            cache["hits"] += event.data["hits"]
+            cache["misses"] += event.data["misses"]
+
+    def to_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "seconds": perf_counter() - self.started,
+            "stages": self.stages,
+            "requests": self.requests,
+            "latency_buckets_ms": LATENCY_BUCKETS_MS,
+            "retries": self.retries,
+            "cache": self.cache,
+            "solver": self.solver
+        }
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="UTF-8") as file:
+            dump(self.to_dict(), file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    pass
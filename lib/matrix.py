@@ -0,0 +1,76 @@
+from array import array
+from hashlib import sha256
+from sys import byteorder
+
+MISSING = -1
+
+class DurationMatrix:
+    """
+    Square matrix of durations kept in one flat array of integers.
+
+    The diagonal and the cells not known yet hold MISSING.
+    Rows are writable views into the array, so matrix[i][j]
+    reads and writes like a list of lists.
+    """
+    def __init__(self, size: int, durations: array =None):
+        self.size = size
+        self.durations = durations if durations is not None else array("q", [MISSING])*(size*size)
+    def __len__(self) -> int:
+        return self.size
+    def __getitem__(self, i: int) -> memoryview:
+        if not 0 <= i < self.size:
+            raise IndexError("row index out of range")
+        return memoryview(self.durations)[i*self.size:(i + 1)*self.size]
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+    def __eq__(self, other) -> bool:
+        if isinstance(other, DurationMatrix):
+            return self.size == other.size and self.durations == other.durations
+        return self.to_list() == other
+    def __repr__(self) -> str:
+        return f"DurationMatrix({self.to_list()})"
+
+    def get(self, i: int, j: int) -> int:
+        return self.durations[i*self.size + j]
+    def set(self, i: int, j: int, duration: int) -> None:
+        self.durations[i*self.size + j] = duration
+
+    def get_digest(self) -> str:
+        """
+        Hash of the durations, the same whatever array holds them.
+        """
+        durations = array("q", self.durations)
+        if byteorder == "big":
+            durations.byteswap()
+        return sha256(self.size.to_bytes(4, "little") + durations.tobytes()).hexdigest()
+
+    def submatrix(self, points: list[int]):
+        """
+        Copy of the cells between points, in their order.
+        """
+        matrix = DurationMatrix(len(points))
+        for i, start in enumerate(points):
+            row = self[start]
+            for j, goal in enumerate(points):
+                matrix.set(i, j, row[goal])
+        return matrix
+
+    def to_list(self) -> list[list[int]]:
+        """
+        Copy into a list of lists with None for MISSING cells.
+        """
+        return [[None if duration == MISSING else duration for duration in row] for row in self]
+
+    @classmethod
+    def from_list(cls, rows: list[list[int]]):
+        matrix = cls(len(rows))
+        for i, row in enumerate(rows):
+            for j, duration in enumerate(row):
+                if duration is not None:
+                    matrix.set(i, j, duration)
+        return matrix
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,68 @@
+from array import array
+from ast import literal_eval
+from json import dump, load
+from mmap import mmap, ACCESS_READ
+from sys import byteorder
+from lib.matrix import DurationMatrix
+from lib.utils import RoptoError
+
+NPY_MAGIC = b"\x93NUMPY"
+# header of format version 1.0 is padded so the data starts aligned
+NPY_ALIGNMENT = 64
+
+class MatrixFileError(RoptoError):
+    pass
+
+def get_sidecar_path(path: str) -> str:
+    return path[:-len(".npy")] + ".json" if path.endswith(".npy") else path + ".json"
+
+def write_matrix_file(path: str, duration_matrix: DurationMatrix, geocodes: list[dict], coordinates: list[str], last: int) -> None:
+    """
+    Write duration_matrix as a .npy file of little endian 32 bit
+    integers with MISSING on the diagonal, which numpy.load reads as
+    well, and the stops beside it in a JSON sidecar. last is the stop
+    of the last line of the address file, the end with set end.
+    """
+    size = len(duration_matrix)
+    header = f"{{'descr': '<i4', 'fortran_order': False, 'shape': ({size}, {size}), }}"
+    header += " "*(-(len(NPY_MAGIC) + 4 + len(header) + 1) % NPY_ALIGNMENT) + "\n"
+    durations = array("i", duration_matrix.durations)
+    if byteorder == "big":
+        durations.byteswap()
+    with open(path, "wb") as file:
+        file.write(NPY_MAGIC + bytes([1, 0]) + len(header).to_bytes(2, "little") + header.encode("latin1"))
+        file.write(durations.tobytes())
+    with open(get_sidecar_path(path), "w", encoding="UTF-8") as file:
+        dump({"geocodes": geocodes, "coordinates": coordinates, "last": last}, file, ensure_ascii=False)
+
+def read_matrix_file(path: str) -> tuple[DurationMatrix, list[dict], list[str], int]:
+    """
+    Map a file of write_matrix_file into memory.
+
+    The durations are not copied, the matrix reads the mapped file
+    through a memoryview, except on big endian machines.
+    It returns the matrix, geocodes, coordinates and last stop.
+    """
+    try:
+        with open(path, "rb") as file:
+            mapped = mmap(file.fileno(), 0, access=ACCESS_READ)
+        with open(get_sidecar_path(path), "r", encoding="UTF-8") as file:
+            sidecar = load(file)
+    except (OSError, ValueError) as err:
+        raise MatrixFileError(f"행렬 파일을 읽을 수 없습니다. {err.__class__.__name__}: {err}")
+    if mapped[:len(NPY_MAGIC)] != NPY_MAGIC or mapped[len(NPY_MAGIC)] != 1:
+        raise MatrixFileError(f"{path}는 지원하는 .npy 파일이 아닙니다.")
+    header_length = int.from_bytes(mapped[8:10], "little")
+    header = literal_eval(mapped[10:10 + header_length].decode("latin1"))
+    size = header["shape"][0]
+    if header["descr"] != "<i4" or header["fortran_order"] or header["shape"] != (size, size) or size != len(sidecar["coordinates"]):
+        raise MatrixFileError(f"{path}는 이동 시간 행렬 파일이 아닙니다. {header}")
+    durations = memoryview(mapped)[10 + header_length:10 + header_length + size*size*4].cast("i")
+    if byteorder == "big":
+        durations = array("i", durations)
+        durations.byteswap()
+    return DurationMatrix(size, durations), sidecar["geocodes"], sidecar["coordinates"], sidecar["last"]
+
+
+if __name__ == "__main__":
+    pass
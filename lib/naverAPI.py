@@ -2,11 +2,21 @@
 # Jan 14, 2022
 # github.com/mrharrykim
 
-from http.client import HTTPSConnection
-from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from http.client import HTTPConnection, HTTPException, HTTPSConnection, RemoteDisconnected
+from queue import Empty, LifoQueue
+from random import random
+from socket import SHUT_RDWR
+from threading import Event, Lock
+from time import monotonic, perf_counter, sleep
+from urllib.parse import quote, urlsplit
 from json import loads
-from config import TOTAL_OUTPUT_LENGTH_VERBOSE_2, OUTPUT_COMPLETE_INDICATOR
-from lib.utils import RoptoError
+from config import API_URL, MAX_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY, CANCEL_POLL_INTERVAL
+from lib.utils import RoptoError, RunCancelledError, normalize_address
+from lib.cache import RoptoCache
+from lib.checkpoint import MatrixCheckpoint
+from lib.matrix import DurationMatrix, MISSING
+from lib.events import EventEmitter, STAGE_START, STAGE_END, ITEM_DONE, RETRY, CACHE, REQUEST, get_emitter
 
 class InvalidAddressError(RoptoError):
     pass
@@ -14,26 +24,227 @@ class InvalidAddressError(RoptoError):
 class RequestFailedError(RoptoError):
     pass
 
+# rate limited or failed on the server side, worth trying again
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Client side rate limiter shared by every worker.
+
+    It allows rate requests per second on average and bursts of up to
+    capacity requests.
+    """
+    def __init__(self, rate: float, capacity: int =None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.lock = Lock()
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated)*self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens)/self.rate
+            sleep(wait_time)
+
 class NaverOpenAPI:
     """
     Context manager for Naver API connection.
 
+    Inside the context, requests share a pool of keep-alive
+    connections. Contexts may nest and the pool is closed only when
+    the outermost one exits, so a long-lived caller keeps it across
+    requests by entering once. With workers > 1 they are sent concurrently, and
+    rate_limit caps how many requests per second leave the client.
+    With cache, geocodes and durations are read through it and only
+    misses go to the network. Transient failures are retried up to
+    retries times with exponential backoff and jitter.
+    url points to another server with the same endpoints, for example
+    the mock server of the benchmarks.
+
+    Progress is emitted to events with stage "geocode" or "direction".
+    Without events, it is printed according to verbose. Setting cancel
+    stops the requests in flight and raises RunCancelledError.
+
     Please Refer to https://api.ncloud-docs.com/docs/en/home
     for more information about Naver Open API.
     """
-    def __init__(self, id: str, key: str, verbose: int =1):
+    def __init__(self, id: str, key: str, verbose: int =1, workers: int =1, rate_limit: float =None, cache: RoptoCache =None, retries: int =MAX_RETRIES, checkpoint: bool =True, url: str =API_URL, events: EventEmitter =None, cancel: Event =None):
         self.id = id
         self.key = key
         self.verbose = verbose
-    def __enter__(self) -> HTTPSConnection:
-        self.conn = HTTPSConnection("naveropenapi.apigw.ntruss.com")
-        return self.conn
+        self.cache = cache
+        self.retries = max(retries, 0)
+        self.checkpoint = checkpoint
+        self.url = urlsplit(url)
+        self.events = get_emitter(verbose, events)
+        self.cancel = cancel
+        self.workers = max(1, workers)
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.depth = 0
+        self.connection_lock = Lock()
+    def __enter__(self):
+        if not self.depth:
+            self.idle_connections = LifoQueue()
+            self.connections = set()
+        self.depth += 1
+        return self
     def __exit__(self, type, value, traceback) -> None:
-        self.conn.close()
+        self.depth -= 1
+        if not self.depth:
+            self.close_connections()
+
+    def close_connections(self) -> None:
+        with self.connection_lock:
+            connections = list(self.connections)
+            self.connections.clear()
+        for conn in connections:
+            # shutting down wakes up the worker blocked on the socket
+            if conn.sock:
+                try:
+                    conn.sock.shutdown(SHUT_RDWR)
+                except OSError:
+                    pass
+            conn.close()
+
+    def check_cancel(self) -> None:
+        if self.cancel and self.cancel.is_set():
+            raise RunCancelledError("계산이 취소되었습니다.")
 
     def get_keypair(self):
         return {"X-NCP-APIGW-API-KEY-ID": self.id, "X-NCP-APIGW-API-KEY": self.key}
-    
+
+    def get_connection(self) -> tuple[HTTPConnection, bool]:
+        """
+        An idle connection of the pool, or a new one.
+        The second value tells whether it was idle.
+        """
+        try:
+            return self.idle_connections.get_nowait(), True
+        except Empty:
+            return self.new_connection(), False
+
+    def new_connection(self) -> HTTPConnection:
+        conn = (HTTPSConnection if self.url.scheme == "https" else HTTPConnection)(self.url.netloc)
+        with self.connection_lock:
+            self.connections.add(conn)
+        return conn
+
+    def discard_connection(self, conn: HTTPConnection) -> None:
+        conn.close()
+        with self.connection_lock:
+            self.connections.discard(conn)
+
+    def send(self, path: str) -> tuple[HTTPConnection, int, bytes]:
+        """
+        Send GET request and read the response over a pooled connection.
+
+        The server may close a keep-alive connection while it is idle,
+        so a request failing on one is sent once more on a new
+        connection without counting as a retry.
+        """
+        conn, idle = self.get_connection()
+        while True:
+            try:
+                conn.request("GET", self.url.path.rstrip("/") + path, headers=self.get_keypair())
+                response = conn.getresponse()
+                return conn, response.status, response.read()
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.discard_connection(conn)
+                if not idle:
+                    raise
+                conn, idle = self.new_connection(), False
+            except BaseException:
+                self.discard_connection(conn)
+                raise
+
+    def request(self, path: str) -> tuple[int, dict]:
+        """
+        Send GET request over a pooled connection and parse the body.
+
+        Connection errors, unreadable bodies and TRANSIENT_STATUSES are
+        retried. Other statuses are returned to the caller at once.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY*2**(attempt - 1))*random()
+                self.events.emit(RETRY, "request", attempt, self.retries, path=path, failure=failure, delay=delay)
+                if self.cancel:
+                    self.cancel.wait(delay)
+                else:
+                    sleep(delay)
+            self.check_cancel()
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            started = perf_counter()
+            try:
+                conn, status, raw_body = self.send(path)
+            except (OSError, HTTPException) as err:
+                failure = f"{err.__class__.__name__}: {err}"
+                continue
+            self.events.emit(REQUEST, "request", endpoint=path.split("?")[0], status=status, latency=perf_counter() - started, bytes=len(raw_body))
+            try:
+                body = loads(raw_body)
+            except ValueError as err:
+                self.discard_connection(conn)
+                failure = f"{err.__class__.__name__}: {err}"
+                continue
+            self.idle_connections.put(conn)
+            if status in TRANSIENT_STATUSES:
+                failure = f"{status}, {body}"
+                continue
+            return status, body
+        raise RequestFailedError(f"{self.retries + 1}번 시도하였으나 실패하였습니다. {failure}\n지민이에게 도움 요청!")
+
+    def report_cache(self, stage: str, hits: int, misses: int) -> None:
+        self.events.emit(CACHE, stage, hits=self.cache.hits - hits, misses=self.cache.misses - misses)
+
+    def run_tasks(self, function, tasks: list, stage: str) -> list:
+        """
+        Call function on every task, concurrently if workers > 1.
+
+        Results keep the order of tasks. The first error cancels
+        the tasks not started yet and is raised again.
+        """
+        results = [None]*len(tasks)
+        done = 0
+        self.events.emit(STAGE_START, stage, 0, len(tasks))
+        with self:
+            # with cancel, even a single worker runs aside to be interrupted
+            if self.workers == 1 and not self.cancel:
+                for index, task in enumerate(tasks):
+                    self.check_cancel()
+                    results[index] = function(task)
+                    done += 1
+                    self.events.emit(ITEM_DONE, stage, done, len(tasks))
+            else:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    futures = {executor.submit(function, task): index for index, task in enumerate(tasks)}
+                    pending = set(futures)
+                    while pending:
+                        finished, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                        if self.cancel and self.cancel.is_set():
+                            for other in pending:
+                                other.cancel()
+                            self.close_connections()
+                            self.check_cancel()
+                        for future in finished:
+                            if future.exception():
+                                for other in pending:
+                                    other.cancel()
+                                raise future.exception()
+                            results[futures[future]] = future.result()
+                            done += 1
+                        if finished:
+                            self.events.emit(ITEM_DONE, stage, done, len(tasks))
+        self.events.emit(STAGE_END, stage, done, len(tasks))
+        return results
+
     def get_geocodes(self, *addresses: str, coordinate_only=False):
         """
         Get detailed information about given addresses
@@ -41,75 +252,134 @@ class NaverOpenAPI:
         It takes human readable addresses and gives full addresses
         and coordinates in longitude & latitude.
         """
-        geocoded_addresses: list[dict] = []
-        output_prefix = "Requesting geocodes using Naver API"
-        
-        # create context with https connection which is 'api'
-        with self as conn:
-            for address in addresses:
-                encoded_address = quote(address)
-                conn.request("GET", f"/map-geocode/v2/geocode?query={encoded_address}", headers=self.get_keypair())
-                geocoding_response = conn.getresponse()
-                geocoding_json = geocoding_response.read()
-                geocoding_body = loads(geocoding_json)
-                
-                if geocoding_response.status != 200:
-                    raise RequestFailedError(f"{geocoding_response.status}, {geocoding_body}\n지민이에게 도움 요청!")
-                if geocoding_body["meta"]["totalCount"] == 0:
-                    raise InvalidAddressError(f"주어진 주소를 찾을 수 없습니다. 주어진 주소: '{address}'. 다른 방식으로 입력해 주세요. 예) 원주시 지니기길 11-20")
-                if geocoding_body["meta"]["totalCount"] > 1:
-                    raise InvalidAddressError(f"주어진 주소가 유일한 주소가 아닙니다. 주어진 주소: '{address}'. 더 상세한 주소로 변경해야 될 수 있습니다. 예) 원주시 지니기길 11-20")
-                if coordinate_only:
-                    geocoded_addresses.append(geocoding_body["addresses"][0]["x"] + "," + geocoding_body["addresses"][0]["y"])
-                else:
-                    geocoded_addresses.append(geocoding_body["addresses"][0])
-                
-                if self.verbose == 2:
-                    output_progress = f"{len(geocoded_addresses)}/{len(addresses)}"
-                    print(output_prefix + "."*(TOTAL_OUTPUT_LENGTH_VERBOSE_2 - len(output_prefix) - len(output_progress)) + output_progress, end="\r")
-        if self.verbose == 2:
-            print(output_prefix + "."*(TOTAL_OUTPUT_LENGTH_VERBOSE_2 - len(output_prefix) - len(OUTPUT_COMPLETE_INDICATOR)) + OUTPUT_COMPLETE_INDICATOR)
+        def get_geocode(address: str):
+            encoded_address = quote(address)
+            status, geocoding_body = self.request(f"/map-geocode/v2/geocode?query={encoded_address}")
+            if status != 200:
+                raise RequestFailedError(f"{status}, {geocoding_body}\n지민이에게 도움 요청!")
+            if geocoding_body["meta"]["totalCount"] == 0:
+                raise InvalidAddressError(f"주어진 주소를 찾을 수 없습니다. 주어진 주소: '{address}'. 다른 방식으로 입력해 주세요. 예) 원주시 지니기길 11-20")
+            if geocoding_body["meta"]["totalCount"] > 1:
+                raise InvalidAddressError(f"주어진 주소가 유일한 주소가 아닙니다. 주어진 주소: '{address}'. 더 상세한 주소로 변경해야 될 수 있습니다. 예) 원주시 지니기길 11-20")
+            geocode = geocoding_body["addresses"][0]
+            if self.cache:
+                self.cache.set_geocode(normalize_address(address), geocode)
+            return geocode
+
+        geocoded_addresses: list[dict] = [None]*len(addresses)
+        if self.cache:
+            hits, misses = self.cache.hits, self.cache.misses
+            for index, address in enumerate(addresses):
+                geocoded_addresses[index] = self.cache.get_geocode(normalize_address(address))
+        missed_indices = [index for index, geocode in enumerate(geocoded_addresses) if geocode is None]
+        try:
+            fetched = self.run_tasks(get_geocode, [addresses[index] for index in missed_indices], "geocode")
+        finally:
+            if self.cache:
+                self.cache.flush()
+        for index, geocode in zip(missed_indices, fetched):
+            geocoded_addresses[index] = geocode
+        if self.cache:
+            self.report_cache("geocode", hits, misses)
+
+        if coordinate_only:
+            return [geocode["x"] + "," + geocode["y"] for geocode in geocoded_addresses]
         return geocoded_addresses
-    def get_directions(self, *coordinates: str, duration_only=False):
+    def get_directions(self, *coordinates: str, duration_only=False, pairs: list[tuple[int, int]] =None):
         """
         Get overall directions from each coordinates to other coordinates.
 
         coordinate is of a form "<longitude>,<latitude>".
         It returns matrix of route between each of coordinates
         except the diagonal ones which is None.
+        With pairs, only those (start index, goal index) cells are
+        requested and the others are left None.
+        Full routes are large, so ask only for the legs you need.
+        With duration_only, it is the same as get_durations.
         """
+        if duration_only:
+            return self.get_durations(*coordinates, pairs=pairs)
         direction_matrix = []
         # to prevent lists that have the same memory address
         for i in range(len(coordinates)):
             direction_matrix.append([None]*len(coordinates))
 
-        output_prefix = "Requesting directions using Naver API"
-
-        with self as conn:
-            for i, start in enumerate(coordinates):
-                for j, goal in enumerate(coordinates):
-                    if start == goal:
-                        continue
-                    conn.request("GET", f"/map-direction/v1/driving?start={start}&goal={goal}", headers=self.get_keypair())
-                    direction_response = conn.getresponse()
-                    direction_json = direction_response.read()
-                    direction_body = loads(direction_json)
-                    if direction_response.status != 200:
-                        raise RequestFailedError(f"{direction_response.status}\n{direction_body}\n지민이에게 도움 요청!")
-                    if direction_body["code"] != 0:
-                        raise RequestFailedError(f"{direction_body}\n지민이에게 도움 요청!")
-                    
-                    if duration_only:
-                        direction_matrix[i][j] = direction_body["route"]["traoptimal"][0]["summary"]["duration"]
-                    else:
-                        direction_matrix[i][j] = direction_body["route"]["traoptimal"][0]
-                    if self.verbose == 2:
-                        output_progress = f"{i*(len(coordinates)-1)+(j if j>i else j+1)}/{len(coordinates)*(len(coordinates)-1)}"
-                        print(output_prefix + "."*(TOTAL_OUTPUT_LENGTH_VERBOSE_2 - len(output_prefix) - len(output_progress)) + output_progress, end="\r")
-        if self.verbose == 2:
-            print(output_prefix + "."*(TOTAL_OUTPUT_LENGTH_VERBOSE_2 - len(output_prefix) - len(OUTPUT_COMPLETE_INDICATOR)) + OUTPUT_COMPLETE_INDICATOR)
+        pairs = self.get_pairs(coordinates, pairs)
+        try:
+            directions = self.run_tasks(lambda pair: self.request_direction(coordinates[pair[0]], coordinates[pair[1]]), pairs, "direction")
+        finally:
+            if self.cache:
+                self.cache.flush()
+        for (i, j), direction in zip(pairs, directions):
+            direction_matrix[i][j] = direction
         return direction_matrix
 
+    def get_durations(self, *coordinates: str, pairs: list[tuple[int, int]] =None) -> DurationMatrix:
+        """
+        Get driving durations from each coordinates to other coordinates.
+
+        Each response is reduced to its duration as soon as it arrives,
+        so only a dense DurationMatrix is kept. Cells not requested
+        and the diagonal hold MISSING.
+        """
+        duration_matrix = DurationMatrix(len(coordinates))
+        pairs = self.get_pairs(coordinates, pairs)
+        checkpoint = MatrixCheckpoint(list(coordinates)) if self.checkpoint else None
+        if checkpoint:
+            for i, j in pairs:
+                duration = checkpoint.get(i, j)
+                if duration is not None:
+                    duration_matrix.set(i, j, duration)
+        if self.cache:
+            hits, misses = self.cache.hits, self.cache.misses
+            for i, j in pairs:
+                if duration_matrix.get(i, j) == MISSING:
+                    duration = self.cache.get_duration(coordinates[i], coordinates[j])
+                    if duration is not None:
+                        duration_matrix.set(i, j, duration)
+        pairs = [(i, j) for i, j in pairs if duration_matrix.get(i, j) == MISSING]
+
+        def get_duration(pair: tuple[int, int]) -> None:
+            duration = self.request_direction(coordinates[pair[0]], coordinates[pair[1]])["summary"]["duration"]
+            duration_matrix.set(*pair, duration)
+            if checkpoint:
+                checkpoint.add(*pair, duration)
+
+        try:
+            self.run_tasks(get_duration, pairs, "direction")
+        except BaseException:
+            if checkpoint:
+                checkpoint.save()
+            raise
+        finally:
+            if self.cache:
+                self.cache.flush()
+        if checkpoint:
+            checkpoint.discard()
+        if self.cache:
+            self.report_cache("direction", hits, misses)
+        return duration_matrix
+
+    def get_pairs(self, coordinates: tuple[str], pairs: list[tuple[int, int]] =None) -> list[tuple[int, int]]:
+        if pairs is None:
+            return [(i, j) for i, start in enumerate(coordinates) for j, goal in enumerate(coordinates) if start != goal]
+        return [(i, j) for i, j in pairs if coordinates[i] != coordinates[j]]
+
+    def request_direction(self, start: str, goal: str) -> dict:
+        """
+        Get the optimal route from start to goal.
+
+        Its duration is stored in the cache.
+        """
+        status, direction_body = self.request(f"/map-direction/v1/driving?start={start}&goal={goal}")
+        if status != 200:
+            raise RequestFailedError(f"{status}\n{direction_body}\n지민이에게 도움 요청!")
+        if direction_body["code"] != 0:
+            raise RequestFailedError(f"{direction_body}\n지민이에게 도움 요청!")
+        direction = direction_body["route"]["traoptimal"][0]
+        if self.cache:
+            self.cache.set_duration(start, goal, direction["summary"]["duration"])
+        return direction
 
 if __name__ == "__main__":
     # def coordinate_of(geocode: dict) -> str:
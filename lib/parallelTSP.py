@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, islice
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count
+from lib.solveTSP import TSPSolver, TableTooLargeError
+from lib.events import EventEmitter, ITEM_DONE
+from config import PARALLEL_TABLE_LIMIT
+
+# largest duration the cost table holds
+UNREACHABLE_32 = 2**31 - 1
+
+# tables of a worker process, attached once by attach_tables
+worker_tables = {}
+
+def attach_tables(cost_name: str, parent_name: str, size: int, arrivals: list[list[int]]) -> None:
+    cost_memory = SharedMemory(name=cost_name)
+    parent_memory = SharedMemory(name=parent_name)
+    worker_tables.update(cost_memory=cost_memory, parent_memory=parent_memory, size=size, arrivals=arrivals)
+
+def build_layer_part(layer: int, part: int, parts: int) -> None:
+    """
+    Fill the entries of every part-th subset with layer points,
+    reading only the entries of the layer below.
+    """
+    # views are released after each part, so the memory can be closed at exit
+    with worker_tables["cost_memory"].buf.cast("i") as cost, worker_tables["parent_memory"].buf.cast("b") as parent:
+        fill_entries(cost, parent, worker_tables["size"], worker_tables["arrivals"], layer, part, parts)
+
+def fill_entries(cost: memoryview, parent: memoryview, size: int, arrivals: list[list[int]], layer: int, part: int, parts: int) -> None:
+    for members in islice(combinations(range(size), layer), part, None, parts):
+        subset = 0
+        for k in members:
+            subset |= 1 << k
+        base = subset*size
+        for j in members:
+            previous_base = (subset ^ (1 << j))*size
+            arrival = arrivals[j]
+            shortest = UNREACHABLE_32
+            shortest_from = -1
+            for k in members:
+                if k == j:
+                    continue
+                duration = cost[previous_base + k] + arrival[k]
+                if duration < shortest:
+                    shortest = duration
+                    shortest_from = k
+            cost[base + j] = shortest
+            parent[base + j] = shortest_from
+
+class ParallelTSPSolver(TSPSolver):
+    """
+    Exact solver building the Held-Karp table on a pool of processes.
+
+    Subsets with the same number of points only read subsets with one
+    point less, so each layer is split between processes which write
+    into tables in shared memory. Costs are kept as 32 bit integers,
+    which is a fifth of the memory of TSPSolver with the parents.
+    Tables over table_limit bytes, or paths which may not fit in 32
+    bits, are refused with TableTooLargeError before anything starts.
+    """
+    name = "Held-Karp (exact, parallel)"
+    entry_bytes = 4 + 1
+
+    def __init__(self, verbose: int =1, processes: int =None, table_limit: int =PARALLEL_TABLE_LIMIT, events: EventEmitter =None, cancel=None):
+        super().__init__(verbose, events, cancel, table_limit)
+        self.processes = processes or cpu_count()
+
+    def solve(self, duration_matrix: list[list[int]], no_return: bool, end: int =None):
+        self.check_table(len(duration_matrix))
+        longest = sum(max(duration for j, duration in enumerate(row) if j != i) for i, row in enumerate(duration_matrix) if len(row) > 1)
+        if longest >= UNREACHABLE_32:
+            raise TableTooLargeError("이동 시간이 너무 길어 정확한 계산의 표에 담을 수 없습니다.")
+        try:
+            return super().solve(duration_matrix, no_return, end)
+        finally:
+            self.release_tables()
+
+    def build_table(self) -> None:
+        matrix = self.duration_matrix
+        size = len(matrix) - 1
+        self.size = size
+        entries = max((1 << size)*size, 1)
+        self.cost_memory = SharedMemory(create=True, size=entries*4)
+        self.parent_memory = SharedMemory(create=True, size=entries)
+        self.cost = self.cost_memory.buf.cast("i")
+        self.parent = self.parent_memory.buf.cast("b")
+        arrivals = [[matrix[k + 1][j + 1] for k in range(size)] for j in range(size)]
+        for j in range(size):
+            self.cost[(1 << j)*size + j] = matrix[0][j + 1]
+            self.parent[(1 << j)*size + j] = -1
+
+        self.events.emit(ITEM_DONE, "solve", 1, size)
+        with ProcessPoolExecutor(max_workers=self.processes, initializer=attach_tables, initargs=(self.cost_memory.name, self.parent_memory.name, size, arrivals)) as executor:
+            for layer in range(2, size + 1):
+                self.check_cancel()
+                parts = min(self.processes, len(arrivals))
+                for future in [executor.submit(build_layer_part, layer, part, parts) for part in range(parts)]:
+                    future.result()
+                self.events.emit(ITEM_DONE, "solve", layer, size)
+
+    def release_tables(self) -> None:
+        if not hasattr(self, "cost_memory"):
+            return
+        self.cost.release()
+        self.parent.release()
+        for memory in (self.cost_memory, self.parent_memory):
+            memory.close()
+            memory.unlink()
+        del self.cost_memory, self.parent_memory
+
+
+if __name__ == "__main__":
+    pass
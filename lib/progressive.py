@@ -0,0 +1,82 @@
+from lib.naverAPI import NaverOpenAPI
+from lib.heuristicTSP import HeuristicTSPSolver
+from lib.matrix import DurationMatrix, MISSING
+from lib.solveTSP import Route
+from lib.utils import get_distance, fill_estimates
+from lib.events import EventEmitter, PREVIEW, get_emitter
+from config import ESTIMATE_MS_PER_METER, PREVIEW_TIME_LIMIT, PROGRESSIVE_BATCH_SIZE
+
+class ProgressiveSolver:
+    """
+    Solves at once on estimated durations and again as real ones arrive.
+
+    Missing durations of the matrix are first estimated from
+    great-circle distances and a preview route is solved on them.
+    Real durations are then requested batch_size at a time, the legs
+    of the current route first and then the nearest pairs, and after
+    each batch the route is solved again from the current one for
+    preview_time_limit seconds. Every preview is emitted to events as
+    PREVIEW with done and total real durations and output, what
+    describe makes of the route. Once the matrix is real, the given
+    solver has the last word.
+    """
+    def __init__(self, api: NaverOpenAPI, preview_time_limit: float =PREVIEW_TIME_LIMIT, batch_size: int =PROGRESSIVE_BATCH_SIZE, verbose: int =1, events: EventEmitter =None, cancel=None):
+        self.api = api
+        self.preview_time_limit = preview_time_limit
+        self.batch_size = batch_size
+        self.events = get_emitter(verbose, events)
+        self.cancel = cancel
+
+    def solve(self, coordinates: list[str], duration_matrix: DurationMatrix, solver, no_return: bool, end: int, describe, initial: list[int] =None) -> Route:
+        """
+        Fill duration_matrix in place and solve on it.
+
+        describe takes a route and the name of how it was made
+        and returns the text to preview.
+        """
+        size = len(duration_matrix)
+        missing = {(i, j) for i in range(size) for j in range(size) if i != j and duration_matrix.get(i, j) == MISSING}
+        total = len(missing)
+        try:
+            fill_estimates(duration_matrix, coordinates, ESTIMATE_MS_PER_METER)
+            preview_solver = HeuristicTSPSolver(time_limit=self.preview_time_limit, seed=0, cancel=self.cancel)
+            route = preview_solver.solve(duration_matrix, no_return, end, initial=initial)
+            self.emit_preview(route, total - len(missing), total, describe)
+
+            nearest = sorted(missing, key=lambda pair: get_distance(coordinates[pair[0]], coordinates[pair[1]]))
+            with self.api:
+                while missing:
+                    batch = list(dict.fromkeys(pair for pair in zip(route.points, route.points[1:]) if pair in missing))[:self.batch_size]
+                    for pair in nearest:
+                        if len(batch) >= self.batch_size:
+                            break
+                        if pair in missing and pair not in batch:
+                            batch.append(pair)
+                    fetched = self.api.get_directions(*coordinates, duration_only=True, pairs=batch)
+                    for i, j in batch:
+                        duration_matrix.set(i, j, fetched.get(i, j))
+                    missing.difference_update(batch)
+                    nearest = [pair for pair in nearest if pair in missing]
+                    if missing:
+                        # estimates get the ratio of the real durations so far
+                        for i, j in missing:
+                            duration_matrix.set(i, j, MISSING)
+                        fill_estimates(duration_matrix, coordinates, ESTIMATE_MS_PER_METER)
+                        route = preview_solver.solve(duration_matrix, no_return, end, initial=route.points)
+                        self.emit_preview(route, total - len(missing), total, describe)
+        except BaseException:
+            # estimates must not pass for real durations in a later run
+            for i, j in missing:
+                duration_matrix.set(i, j, MISSING)
+            raise
+
+        if isinstance(solver, HeuristicTSPSolver):
+            return solver.solve(duration_matrix, no_return, end, initial=route.points)
+        return solver.solve(duration_matrix, no_return, end)
+
+    def emit_preview(self, route: Route, done: int, total: int, describe) -> None:
+        self.events.emit(PREVIEW, "preview", done, total, output=describe(route, f"미리보기 (실제 이동 시간 {done}/{total})"))
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,96 @@
+from lib.naverAPI import NaverOpenAPI
+from lib.matrix import DurationMatrix, MISSING
+from lib.heuristicTSP import HeuristicTSPSolver
+from lib.progressive import ProgressiveSolver
+from lib.solveTSP import Route
+from lib.utils import get_coordinate, normalize_address
+from lib.ingest import get_address_key
+
+class RouteSession:
+    """
+    Stops, geocodes and durations kept in memory between runs.
+
+    set_stops compares the new address list with the current stops.
+    Only addresses never seen are geocoded and only durations from and
+    to new stops are requested, so removing a stop requests nothing.
+    solve warm starts the heuristic engine from the previous route.
+    """
+    def __init__(self, api: NaverOpenAPI):
+        self.api = api
+        # geocodes by get_address_key
+        self.geocodes: dict[str, dict] = {}
+        self.coordinates: list[str] = []
+        self.stop_geocodes: list[dict] = []
+        self.duration_matrix = DurationMatrix(0)
+        self.route: list[str] = []
+
+    def set_stops(self, addresses: list[str], fetch: bool =True) -> None:
+        """
+        Make the stops those of addresses, the first one being the start.
+
+        Addresses at the same coordinate make a single stop. Without
+        fetch, durations not known yet are left MISSING for solve.
+        """
+        normalized_addresses = [normalize_address(address) for address in addresses if address.strip()]
+        missing_addresses = {}
+        for address in normalized_addresses:
+            if get_address_key(address) not in self.geocodes:
+                missing_addresses.setdefault(get_address_key(address), address)
+        if missing_addresses:
+            self.geocodes.update(zip(missing_addresses, self.api.get_geocodes(*missing_addresses.values())))
+
+        stop_geocodes = {}
+        for address in normalized_addresses:
+            geocode = self.geocodes[get_address_key(address)]
+            stop_geocodes.setdefault(get_coordinate(geocode), geocode)
+        coordinates = list(stop_geocodes)
+        stop_geocodes = list(stop_geocodes.values())
+
+        old_indices = {coordinate: index for index, coordinate in enumerate(self.coordinates)}
+        duration_matrix = DurationMatrix(len(coordinates))
+        missing_pairs = []
+        for i, start in enumerate(coordinates):
+            for j, goal in enumerate(coordinates):
+                if i == j:
+                    continue
+                if start in old_indices and goal in old_indices:
+                    duration_matrix.set(i, j, self.duration_matrix.get(old_indices[start], old_indices[goal]))
+                if duration_matrix.get(i, j) == MISSING:
+                    missing_pairs.append((i, j))
+        if missing_pairs and fetch:
+            fetched = self.api.get_directions(*coordinates, duration_only=True, pairs=missing_pairs)
+            for i, j in missing_pairs:
+                duration_matrix.set(i, j, fetched.get(i, j))
+
+        self.coordinates = coordinates
+        self.stop_geocodes = stop_geocodes
+        self.duration_matrix = duration_matrix
+
+    def get_index(self, address: str) -> int:
+        """
+        Index of the stop at address, which must have been set.
+        """
+        return self.coordinates.index(get_coordinate(self.geocodes[get_address_key(address)]))
+
+    def solve(self, solver, no_return: bool, end: int =None, progressive: ProgressiveSolver =None, describe=None) -> Route:
+        """
+        Solve on the current stops, from the previous route when the
+        solver can start from one.
+
+        With progressive, missing durations are requested by it while
+        it previews routes through describe.
+        """
+        indices = {coordinate: index for index, coordinate in enumerate(self.coordinates)}
+        initial = [indices[coordinate] for coordinate in self.route if coordinate in indices] or None
+        if progressive:
+            solution = progressive.solve(self.coordinates, self.duration_matrix, solver, no_return, end, describe, initial=initial)
+        elif isinstance(solver, HeuristicTSPSolver) and initial:
+            solution = solver.solve(self.duration_matrix, no_return, end, initial=initial)
+        else:
+            solution = solver.solve(self.duration_matrix, no_return, end)
+        self.route = [self.coordinates[point] for point in solution.points]
+        return solution
+
+
+if __name__ == "__main__":
+    pass
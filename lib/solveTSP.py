@@ -2,13 +2,29 @@
 # Jan 14, 2022
 # github.com/mrharrykim
 
+from array import array
 from datetime import timedelta
-from lib.utils import RoptoError
-from config import TOTAL_OUTPUT_LENGTH_VERBOSE_2, OUTPUT_COMPLETE_INDICATOR
+from lib.utils import RoptoError, RunCancelledError
+from lib.events import EventEmitter, STAGE_START, STAGE_END, ITEM_DONE, get_emitter
+from config import EXACT_TABLE_LIMIT
+
+UNREACHABLE = 2**62
+# mask of subsets between two progress reports
+PROGRESS_INTERVAL = 2**12 - 1
 
 class RouteOperationNotPermittedError(RoptoError):
     pass
 
+class TableTooLargeError(RoptoError):
+    pass
+
+def get_table_bytes(points: int, entry_bytes: int) -> int:
+    """
+    Memory a Held-Karp table of points including the point 0 takes.
+    """
+    size = max(points - 1, 0)
+    return (1 << size)*size*entry_bytes
+
 class Route:
     """
     Abstract route resembles a path on a weighted graph.
@@ -45,55 +61,157 @@ class Route:
         return f"route through: {self.points}\ntakes: {duration_formatted}"
 
 class TSPSolver:
-    def __init__(self, verbose: int =1):
+    """
+    Exact solver for traveling salesman problem (TSP).
+
+    The table built by build_table holds, for every subset of points
+    and every point in it, the duration of the shortest path which
+    starts from the point 0, passes through the whole subset and ends
+    at that point. Subsets are encoded as bitmasks where the bit k
+    stands for the point k+1.
+
+    Progress of building the table is emitted to events as subsets
+    done out of total, and setting cancel raises RunCancelledError.
+    Tables over table_limit bytes are refused with TableTooLargeError
+    before they are allocated.
+    """
+    name = "Held-Karp (exact)"
+    # bytes of a cost and a parent entry
+    entry_bytes = 8 + 1
+
+    def __init__(self, verbose: int =1, events: EventEmitter =None, cancel=None, table_limit: int =EXACT_TABLE_LIMIT):
         self.verbose = verbose
+        self.events = get_emitter(verbose, events)
+        self.cancel = cancel
+        self.table_limit = table_limit
+
+    def check_table(self, points: int) -> None:
+        """
+        Refuse tables over table_limit bytes before allocating them.
+        """
+        table_bytes = get_table_bytes(points, self.entry_bytes)
+        if table_bytes > self.table_limit:
+            raise TableTooLargeError(f"주소 {points}개의 정확한 계산에는 {table_bytes/2**20:,.0f} MiB의 메모리가 필요하여 제한({self.table_limit/2**20:,.0f} MiB)을 넘습니다. 다른 계산 방식을 사용하세요.")
+
+    def check_cancel(self) -> None:
+        if self.cancel and self.cancel.is_set():
+            raise RunCancelledError("계산이 취소되었습니다.")
+
+    def solve(self, duration_matrix: list[list[int]], no_return: bool, end: int =None) -> Route:
+        """
+        Solve TSP on duration_matrix starting from the point 0.
 
-    def solve(self, duration_matrix: list[list[int]], no_return: bool) -> Route:
-        output_prefix = "Solving TSP"
-        if self.verbose == 2:
-            print(output_prefix + "."*(TOTAL_OUTPUT_LENGTH_VERBOSE_2 - len(output_prefix)), end="\r")
+        * no_return: the route ends at whichever point is the best.
+        * end: the route ends at this point. 0 makes a closed tour.
+        Every mode reads the same table, so they cost the same.
+        """
+        self.check_table(len(duration_matrix))
+        self.events.emit(STAGE_START, "solve", engine=self.name)
         self.duration_matrix = duration_matrix
+        self.build_table()
         through = set(range(len(duration_matrix)))
         through.remove(0)
-        if no_return:
-            shortest_route = None
-            for point in through:
-                copy_of_through = through.copy()
-                copy_of_through.remove(point)
-                route = self.get_shortest_route(copy_of_through, point)
-                if not shortest_route:
-                    shortest_route = route
-                else:
-                    if route < shortest_route:
-                        shortest_route = route
-            solution = shortest_route
+        if not through:
+            solution = Route([0], 0)
+        elif end:
+            through.remove(end)
+            solution = self.get_shortest_route(through, end)
+        elif no_return and end is None:
+            solution = self.get_shortest_path(through)
         else:
             solution = self.get_shortest_route(through, 0)
-        if self.verbose == 2:
-            print(output_prefix + "."*(TOTAL_OUTPUT_LENGTH_VERBOSE_2 - len(output_prefix) - len(OUTPUT_COMPLETE_INDICATOR)) + OUTPUT_COMPLETE_INDICATOR)
+        size = len(duration_matrix) - 1
+        self.events.emit(STAGE_END, "solve", engine=self.name, duration=solution.duration, states=(1 << size)*size, transitions=size*(size - 1)*(1 << size)//4)
         return solution
 
+    def build_table(self) -> None:
+        """
+        Implementation of Held-Karp algorithm.
+
+        It fills cost and parent table in O(n^2 * 2^n) time.
+        Subsets are visited in increasing order so that every subset
+        without its last point is already computed.
+        """
+        matrix = self.duration_matrix
+        size = len(matrix) - 1
+        self.size = size
+        self.cost = array("q", [UNREACHABLE])*((1 << size)*size)
+        self.parent = array("b", [-1])*((1 << size)*size)
+        # arrivals[j][k] is the duration from the point k+1 to the point j+1
+        arrivals = [[matrix[k + 1][j + 1] for k in range(size)] for j in range(size)]
+        cost = self.cost
+        parent = self.parent
+
+        for j in range(size):
+            cost[(1 << j)*size + j] = matrix[0][j + 1]
+        for subset in range(1, 1 << size):
+            if not subset & PROGRESS_INTERVAL:
+                self.check_cancel()
+                self.events.emit(ITEM_DONE, "solve", subset, 1 << size)
+            if not subset & (subset - 1):
+                continue
+            members = [k for k in range(size) if subset >> k & 1]
+            base = subset*size
+            for j in members:
+                previous_base = (subset ^ (1 << j))*size
+                arrival = arrivals[j]
+                shortest = UNREACHABLE
+                shortest_from = -1
+                for k in members:
+                    if k == j:
+                        continue
+                    duration = cost[previous_base + k] + arrival[k]
+                    if duration < shortest:
+                        shortest = duration
+                        shortest_from = k
+                cost[base + j] = shortest
+                parent[base + j] = shortest_from
+
+    def get_shortest_path(self, through: set[int]) -> Route:
+        """
+        Get the shortest route from the point 0 via through which
+        may end at any point of through.
+        """
+        size = self.size
+        subset = 0
+        for point in through:
+            subset |= 1 << (point - 1)
+        duration, last = min((self.cost[subset*size + k], k) for k in range(size) if subset >> k & 1)
+        return Route(self.trace(subset, last), duration)
 
     def get_shortest_route(self, through: set[int], end: int) -> Route:
         """
-        Implementation of Held-Karp algorithm.
+        Get the shortest route from the point 0 to end via through.
 
-        It solves traveling salesman problem (TSP) recursively.
+        Set end to 0 to get the closed tour. build_table must be
+        called beforehand.
         """
-        if not through:
-            return Route([0, end], self.duration_matrix[0][end])
-        
-        shortest_route = None
+        size = self.size
+        subset = 0
         for point in through:
-            copy_of_through = through.copy()
-            copy_of_through.remove(point)
-            route = self.get_shortest_route(copy_of_through, point) + Route([point, end], self.duration_matrix[point][end])
-            if not shortest_route:
-                shortest_route = route
-            else:
-                if route < shortest_route:
-                    shortest_route = route
-        return shortest_route
+            subset |= 1 << (point - 1)
+        if end == 0:
+            duration, last = min((self.cost[subset*size + k] + self.duration_matrix[k + 1][0], k) for k in range(size) if subset >> k & 1)
+            return Route(self.trace(subset, last) + [0], duration)
+        last = end - 1
+        subset |= 1 << last
+        return Route(self.trace(subset, last), self.cost[subset*size + last])
+
+    def trace(self, subset: int, last: int) -> list[int]:
+        """
+        Follow parent pointers back from the table entry of subset
+        ending at the point last+1.
+        """
+        size = self.size
+        points = []
+        while last >= 0:
+            points.append(last + 1)
+            next_last = self.parent[subset*size + last]
+            subset ^= 1 << last
+            last = next_last
+        points.append(0)
+        points.reverse()
+        return points
 
 
 if __name__ == "__main__":
@@ -4,10 +4,16 @@
 
 from typing import Union
 from re import findall
+from math import asin, cos, radians, sin, sqrt
+from heapq import nsmallest
+from lib.matrix import DurationMatrix, MISSING
 
 class RoptoError(Exception):
     pass
 
+class RunCancelledError(RoptoError):
+    pass
+
 class TimeOperationNotPermittedError(RoptoError):
     pass
 
@@ -38,31 +44,67 @@ class Time:
         else:
             return None
 
-def get_equivalences(items: Union[list, tuple]) -> list[list[int]]:
-    indexs = set(range(len(items)))
-    equivalences = []
-    while indexs:
-        base_index = indexs.pop()
-        equivalence = [base_index]
-        for index in indexs:
-            if items[index] == items[base_index]:
-                equivalence.append(index)
-        indexs = indexs.difference(equivalence)
-        equivalences.append(equivalence)
-    return equivalences
-
-def remove_duplicates(items: Union[list, tuple], equivalences: list[list[int]]) -> list:
-    for equivalence in equivalences:
-        if len(equivalence) > 1:
-            for index in equivalence[1:]:
-                items[index] = None
-    unique_items = [item for item in items if item != None]
-    return unique_items
+def normalize_address(address: str) -> str:
+    return " ".join(address.split())
 
 def get_coordinate(geocode: dict) -> str:
     return geocode["x"] + "," + geocode["y"]
 
-def get_duration(direction: dict) -> Union[None, int]:
-    if not direction:
-        return None
-    return direction["summary"]["duration"]
+def get_distance(start: str, goal: str) -> float:
+    """
+    Great-circle distance in meters between two coordinates
+    of a form "<longitude>,<latitude>".
+    """
+    start_longitude, start_latitude = map(radians, map(float, start.split(",")))
+    goal_longitude, goal_latitude = map(radians, map(float, goal.split(",")))
+    haversine = sin((goal_latitude - start_latitude)/2)**2 + cos(start_latitude)*cos(goal_latitude)*sin((goal_longitude - start_longitude)/2)**2
+    return 2*6_371_000*asin(sqrt(haversine))
+
+def get_nearest_pairs(coordinates: Union[list, tuple], k: int) -> list[tuple[int, int]]:
+    """
+    Pairs between each coordinate and its k nearest coordinates
+    in both directions.
+    """
+    pairs = set()
+    for i, start in enumerate(coordinates):
+        others = (j for j in range(len(coordinates)) if j != i)
+        for j in nsmallest(k, others, key=lambda j: get_distance(start, coordinates[j])):
+            pairs.add((i, j))
+            pairs.add((j, i))
+    return sorted(pairs)
+
+def mirror_durations(duration_matrix: DurationMatrix) -> set[tuple[int, int]]:
+    """
+    Fill each missing duration with the one of the opposite direction.
+    It returns the cells which are mirrored.
+    """
+    mirrored = set()
+    for i, row in enumerate(duration_matrix):
+        for j in range(len(row)):
+            if i != j and row[j] == MISSING and duration_matrix[j][i] != MISSING:
+                row[j] = duration_matrix[j][i]
+                mirrored.add((i, j))
+    return mirrored
+
+def fill_estimates(duration_matrix: DurationMatrix, coordinates: Union[list, tuple], ms_per_meter: float) -> set[tuple[int, int]]:
+    """
+    Fill missing durations with straight-line distances scaled by
+    the ratio measured on the known durations, or by ms_per_meter
+    if none is known. It returns the cells which are estimated.
+    """
+    size = len(coordinates)
+    known_duration = known_distance = 0
+    for i in range(size):
+        for j in range(size):
+            if i != j and duration_matrix[i][j] != MISSING:
+                known_duration += duration_matrix[i][j]
+                known_distance += get_distance(coordinates[i], coordinates[j])
+    if known_distance:
+        ms_per_meter = known_duration/known_distance
+    estimated = set()
+    for i in range(size):
+        for j in range(size):
+            if i != j and duration_matrix[i][j] == MISSING:
+                duration_matrix[i][j] = round(get_distance(coordinates[i], coordinates[j])*ms_per_meter)
+                estimated.add((i, j))
+    return estimated
@@ -0,0 +1,176 @@
+from time import monotonic
+from lib.solveTSP import Route
+from lib.utils import RoptoError, RunCancelledError
+from lib.events import EventEmitter, STAGE_START, STAGE_END, ITEM_DONE, get_emitter
+from config import HEURISTIC_TIME_LIMIT
+
+class RouteLimitError(RoptoError):
+    pass
+
+class VehicleRoutingSolver:
+    """
+    Splits the points of a duration matrix between vehicles leaving the point 0.
+
+    Routes are built by Clarke-Wright savings, joining the route ending
+    at i with the route starting at j in the order of what joining saves,
+    while the joined route keeps within max_stops points and max_duration
+    milliseconds. Points are then moved and swapped between routes while
+    that shortens the total duration, until time_limit (in seconds) runs
+    out. Without either limit, a vehicle visits at most an even share of
+    the points.
+
+    With no_return, the legs back to the point 0 cost nothing.
+    Each route is returned in its constructed order, to be solved again
+    on its own by a TSP solver.
+    """
+    def __init__(self, vehicles: int, max_stops: int =None, max_duration: int =None, time_limit: float =HEURISTIC_TIME_LIMIT, verbose: int =1, events: EventEmitter =None, cancel=None):
+        self.vehicles = vehicles
+        self.max_stops = max_stops
+        self.max_duration = max_duration
+        self.time_limit = time_limit
+        self.events = get_emitter(verbose, events)
+        self.cancel = cancel
+
+    def check_cancel(self) -> None:
+        if self.cancel and self.cancel.is_set():
+            raise RunCancelledError("계산이 취소되었습니다.")
+
+    def solve(self, duration_matrix: list[list[int]], no_return: bool) -> list[Route]:
+        size = len(duration_matrix)
+        self.events.emit(STAGE_START, "partition", 0, size - 1)
+        deadline = monotonic() + self.time_limit
+        self.costs = [[duration_matrix[i][j] if i != j else 0 for j in range(size)] for i in range(size)]
+        self.no_return = no_return
+        self.stop_limit = self.max_stops
+        if self.max_stops is None and self.max_duration is None:
+            self.stop_limit = -(-(size - 1)//self.vehicles)
+
+        routes = self.get_savings_routes(size)
+        while len(routes) > self.vehicles:
+            self.dissolve(routes)
+        # empty routes let points move to the idle vehicles
+        routes += [[] for _ in range(self.vehicles - len(routes))]
+        self.moves = 0
+        while monotonic() < deadline and (self.relocate(routes) or self.swap(routes)):
+            self.check_cancel()
+            self.events.emit(ITEM_DONE, "partition", self.moves, 0)
+
+        solution = [self.to_route(stops) for stops in routes if stops]
+        self.events.emit(STAGE_END, "partition", size - 1, size - 1, routes=len(solution), duration=sum(route.duration for route in solution), moves=self.moves)
+        return solution
+
+    def leg(self, start: int, goal: int) -> int:
+        if goal == 0 and self.no_return:
+            return 0
+        return self.costs[start][goal]
+
+    def get_duration(self, stops: list[int]) -> int:
+        points = [0] + stops + [0]
+        return sum(self.leg(start, goal) for start, goal in zip(points, points[1:]))
+
+    def fits(self, stop_count: int, duration: int) -> bool:
+        if self.stop_limit is not None and stop_count > self.stop_limit:
+            return False
+        return self.max_duration is None or duration <= self.max_duration
+
+    def get_savings_routes(self, size: int) -> list[list[int]]:
+        routes = {point: [point] for point in range(1, size)}
+        durations = {point: self.leg(0, point) + self.leg(point, 0) for point in range(1, size)}
+        for point in range(1, size):
+            if not self.fits(1, durations[point]):
+                raise RouteLimitError(f"{point}번째 주소는 혼자서도 제한 시간 안에 다녀올 수 없습니다.")
+        # route of each point by the id of its first point
+        route_of = {point: point for point in range(1, size)}
+        savings = sorted(((self.leg(i, 0) + self.leg(0, j) - self.leg(i, j), i, j) for i in range(1, size) for j in range(1, size) if i != j), reverse=True)
+        for saving, i, j in savings:
+            if saving <= 0 and len(routes) <= self.vehicles:
+                break
+            first, second = route_of[i], route_of[j]
+            if first == second or routes[first][-1] != i or second != j:
+                continue
+            duration = durations[first] + durations[second] - saving
+            if not self.fits(len(routes[first]) + len(routes[second]), duration):
+                continue
+            routes[first] += routes.pop(second)
+            durations[first] = duration
+            del durations[second]
+            for point in routes[first]:
+                route_of[point] = first
+        return list(routes.values())
+
+    def dissolve(self, routes: list[list[int]]) -> None:
+        """
+        Insert the points of the route with the fewest points into the others.
+
+        Savings may leave more routes than vehicles when the limits
+        split the points unevenly.
+        """
+        stops = min(routes, key=len)
+        routes.remove(stops)
+        for point in stops:
+            insertions = []
+            for other in routes:
+                position, cost = self.get_insertion(other, point)
+                if self.fits(len(other) + 1, self.get_duration(other) + cost):
+                    insertions.append((cost, position, other))
+            if not insertions:
+                raise RouteLimitError(f"차량 {self.vehicles}대로는 제한 안에 모든 주소를 방문할 수 없습니다.")
+            cost, position, other = min(insertions, key=lambda insertion: insertion[:2])
+            other.insert(position, point)
+
+    def get_insertion(self, stops: list[int], point: int) -> tuple[int, int]:
+        """
+        Cheapest position of stops to insert point at, and its cost.
+        """
+        points = [0] + stops + [0]
+        return min((self.leg(points[k], point) + self.leg(point, points[k + 1]) - self.leg(points[k], points[k + 1]), k) for k in range(len(points) - 1))[::-1]
+
+    def relocate(self, routes: list[list[int]]) -> bool:
+        """
+        Move one point to another route if that shortens the total.
+        """
+        durations = [self.get_duration(stops) for stops in routes]
+        for a, stops in enumerate(routes):
+            for index, point in enumerate(stops):
+                previous = stops[index - 1] if index else 0
+                following = stops[index + 1] if index + 1 < len(stops) else 0
+                gain = self.leg(previous, point) + self.leg(point, following) - self.leg(previous, following)
+                for b, other in enumerate(routes):
+                    if a == b or (not other and not stops[1:]):
+                        continue
+                    position, cost = self.get_insertion(other, point)
+                    if cost < gain and self.fits(len(other) + 1, durations[b] + cost) and self.fits(len(stops) - 1, durations[a] - gain):
+                        other.insert(position, stops.pop(index))
+                        self.moves += 1
+                        return True
+        return False
+
+    def swap(self, routes: list[list[int]]) -> bool:
+        """
+        Exchange two points of different routes if that shortens the total.
+        """
+        durations = [self.get_duration(stops) for stops in routes]
+        for a, stops in enumerate(routes):
+            for b in range(a + 1, len(routes)):
+                other = routes[b]
+                for index, point in enumerate(stops):
+                    previous = stops[index - 1] if index else 0
+                    following = stops[index + 1] if index + 1 < len(stops) else 0
+                    removed = self.leg(previous, point) + self.leg(point, following)
+                    for other_index, other_point in enumerate(other):
+                        other_previous = other[other_index - 1] if other_index else 0
+                        other_following = other[other_index + 1] if other_index + 1 < len(other) else 0
+                        delta = self.leg(previous, other_point) + self.leg(other_point, following) - removed
+                        other_delta = self.leg(other_previous, point) + self.leg(point, other_following) - self.leg(other_previous, other_point) - self.leg(other_point, other_following)
+                        if delta + other_delta < 0 and self.fits(len(stops), durations[a] + delta) and self.fits(len(other), durations[b] + other_delta):
+                            stops[index], other[other_index] = other_point, point
+                            self.moves += 1
+                            return True
+        return False
+
+    def to_route(self, stops: list[int]) -> Route:
+        return Route([0] + stops + ([] if self.no_return else [0]), self.get_duration(stops))
+
+
+if __name__ == "__main__":
+    pass
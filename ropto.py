@@ -3,14 +3,36 @@
 # github.com/mrharrykim
 
 from logging import error
-from os import system
-from lib.utils import RoptoError, Time, get_equivalences, remove_duplicates, get_coordinate, get_duration
-from argparse import ArgumentParser
+from os import cpu_count, system
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from time import perf_counter
+from lib.utils import RoptoError, RunCancelledError, Time, get_nearest_pairs, mirror_durations, fill_estimates
+from argparse import ArgumentParser, Namespace
+from itertools import product
+from json import dump, dumps
+from hashlib import sha256
 from getpass import getpass
 from lib.security import decrypt, encrypt
 from lib.naverAPI import NaverOpenAPI
-from lib.solveTSP import TSPSolver
-from config import API_ID, DEFAULT_START_ADDRESS
+from lib.cache import RoptoCache
+from lib.ingest import Ingestion, get_address_key
+from lib.progressive import ProgressiveSolver
+from lib.events import EventEmitter, ConsolePrinter, STAGE_START, STAGE_END, ITEM_DONE, get_emitter
+from lib.matrix import DurationMatrix
+from lib.matrixFile import write_matrix_file, read_matrix_file
+from lib.instrument import RunReport
+from lib.daemon import RoptoDaemon, request_route
+from lib.solveTSP import Route, TSPSolver
+from lib.parallelTSP import ParallelTSPSolver
+from lib.branchBoundTSP import BranchBoundTSPSolver
+from lib.heuristicTSP import HeuristicTSPSolver
+from lib.vehicleRouting import VehicleRoutingSolver
+from lib.cluster import get_clusters, get_centroid, get_candidates, get_cluster_order
+from config import API_ID, EXACT_SOLVER_LIMIT, HEURISTIC_TIME_LIMIT, DEFAULT_WORKERS, DEFAULT_RATE_LIMIT, CACHE_FILE, CACHE_TTL_DAYS, MAX_RETRIES, ESTIMATE_MS_PER_METER, SYMMETRIC_TOLERANCE, API_URL, DAEMON_PORT, BATCH_OUTPUT_SUFFIX, CLUSTER_SIZE, BOUNDARY_CANDIDATES
+
+# options a client may choose for each request to the daemon
+ROUTE_OPTIONS = ["no_return", "set_start", "set_end", "engine", "time_limit", "neighbours", "symmetric", "symmetric_tolerance", "vehicles", "max_stops", "max_duration", "decompose", "cluster_size"]
 
 def get_namespace(args: list[str] =None):
     parser = ArgumentParser(description="ROPTO: Route optimizer", add_help=False)
@@ -18,54 +40,455 @@ def get_namespace(args: list[str] =None):
     group1.add_argument("-f", "--file", default="addr.txt", help="use addresses from this file (default: addr.txt)")
     group1.add_argument("-n", "--no-return", action="store_true", help="don't consider trip from the last point to the initial point")
     group1.add_argument("-s", "--set-start", action="store_true", help="start from the first address in the file")
+    group1.add_argument("-e", "--set-end", action="store_true", help="finish at the last address in the file")
+    group1.add_argument("--engine", choices=["auto", "exact", "parallel", "bnb", "heuristic"], default="auto", help=f"solve exactly up to {EXACT_SOLVER_LIMIT} points and heuristically above it, or force one. parallel solves exactly on --processes processes, bnb by branch and bound within --time-limit (default: auto)")
+    group1.add_argument("-t", "--time-limit", metavar="SECONDS", type=float, default=HEURISTIC_TIME_LIMIT, help=f"time budget of the heuristic and bnb engines (default: {HEURISTIC_TIME_LIMIT})")
+    group1.add_argument("-w", "--workers", metavar="N", type=int, default=DEFAULT_WORKERS, help=f"send up to N api requests at once (default: {DEFAULT_WORKERS})")
+    group1.add_argument("--rate-limit", metavar="N", type=float, default=DEFAULT_RATE_LIMIT, help=f"send at most N api requests per second (default: {DEFAULT_RATE_LIMIT})")
+    group1.add_argument("-k", "--neighbours", metavar="K", type=int, default=0, help="request durations only to the K nearest addresses of each and estimate the others (default: 0, request all)")
+    group1.add_argument("--symmetric", action="store_true", help="request only one direction of each pair and use it for both, then check the route with the other")
+    group1.add_argument("--symmetric-tolerance", metavar="RATIO", type=float, default=SYMMETRIC_TOLERANCE, help=f"solve again if the checked route differs by more than this ratio (default: {SYMMETRIC_TOLERANCE})")
+    group1.add_argument("--retries", metavar="N", type=int, default=MAX_RETRIES, help=f"retry failed api requests up to N times (default: {MAX_RETRIES})")
+    group1.add_argument("--cache", metavar="FILE", default=CACHE_FILE, help=f"keep geocodes and durations in this file (default: {CACHE_FILE})")
+    group1.add_argument("--cache-ttl", metavar="DAYS", type=float, default=CACHE_TTL_DAYS, help=f"forget cached entries older than this (default: {CACHE_TTL_DAYS})")
+    group1.add_argument("--no-cache", action="store_true", help="neither read nor write the cache")
+    group1.add_argument("--vehicles", metavar="K", type=int, default=1, help="split the addresses between K vehicles leaving the start address (default: 1)")
+    group1.add_argument("--max-stops", metavar="N", type=int, help="visit at most N addresses with each vehicle (default: an even share)")
+    group1.add_argument("--max-duration", metavar="MINUTES", type=float, help="keep the route of each vehicle within this many minutes")
+    group1.add_argument("--progressive", action="store_true", help="show a route on straight-line estimates at once and improve it as real durations arrive")
+    group1.add_argument("--decompose", action="store_true", help="solve clusters of nearby addresses one by one and stitch them, for hundreds of addresses")
+    group1.add_argument("--cluster-size", metavar="N", type=int, default=CLUSTER_SIZE, help=f"number of addresses in a cluster with --decompose (default: {CLUSTER_SIZE})")
+    group1.add_argument("-b", "--batch", metavar="PATH", nargs="+", help="solve every given address file, or every .txt file of a given directory, in one run")
+    group1.add_argument("--processes", metavar="N", type=int, default=cpu_count(), help="solve up to N files, vehicles or clusters at once, or build the table of the parallel engine on N processes (default: number of cpus)")
+    group1.add_argument("--output-dir", metavar="DIR", help=f"write the result of each file of the batch here instead of next to it, as <name>{BATCH_OUTPUT_SUFFIX}")
+    group1.add_argument("--export-matrix", metavar="FILE", help="write the addresses and durations to FILE (.npy) and FILE.json to solve them again offline")
+    group1.add_argument("--import-matrix", metavar="FILE", help="solve the addresses and durations of a file of --export-matrix without the api")
+    group1.add_argument("-g", "--geometry", metavar="FILE", help="write the paths of the final route to this file as GeoJSON")
+    group1.add_argument("--api-url", metavar="URL", default=API_URL, help=f"send api requests to this server (default: {API_URL})")
     group2 = parser.add_argument_group("information options")
     group2.add_argument("-h", "--help", action="help", help="show this help message and exit")
+    group2.add_argument("--report", metavar="FILE", help="write timings, api usage and solver statistics of the run to this file as JSON")
     group2.add_argument("-v", "--verbose", metavar="N", choices=range(1, 4), type=int, default=1, help="set how much output is produced (least: 1 - most: 3, default: 1)")
-    group3 = parser.add_argument_group("account options")
-    group3.add_argument("-c", "--chpasswd", action="store_true", help="prompt for new password")
-    group3.add_argument("-r", "--reset", action="store_true", help="reset api key (retoration purpose only)")
-    return parser.parse_args(args)
+    group3 = parser.add_argument_group("daemon options")
+    group3.add_argument("--serve", action="store_true", help="unlock the api key once and solve requests of clients with warm connections and caches")
+    group3.add_argument("--client", action="store_true", help="send the address file to the running daemon instead of solving it here")
+    group3.add_argument("--port", metavar="PORT", type=int, default=DAEMON_PORT, help=f"port of the daemon on this computer (default: {DAEMON_PORT})")
+    group4 = parser.add_argument_group("account options")
+    group4.add_argument("-c", "--chpasswd", action="store_true", help="prompt for new password")
+    group4.add_argument("-r", "--reset", action="store_true", help="reset api key (retoration purpose only)")
+    namespace = parser.parse_args(args)
+    if namespace.retries < 0:
+        parser.error("--retries cannot be negative")
+    if namespace.batch and (namespace.neighbours or namespace.symmetric or namespace.geometry or namespace.decompose or namespace.serve or namespace.client):
+        parser.error("--batch requests every duration and cannot be used with -k, --symmetric, -g, --decompose, --serve or --client")
+    if namespace.progressive and (namespace.neighbours or namespace.symmetric or namespace.vehicles > 1 or namespace.decompose or namespace.batch):
+        parser.error("--progressive cannot be used with -k, --symmetric, --vehicles, --decompose or --batch")
+    if namespace.decompose and (namespace.neighbours or namespace.symmetric or namespace.vehicles > 1):
+        parser.error("--decompose cannot be used with -k, --symmetric or --vehicles")
+    if namespace.cluster_size < 1:
+        parser.error("--cluster-size must be at least 1")
+    if namespace.vehicles > 1 and (namespace.neighbours or namespace.symmetric or namespace.geometry or namespace.set_end or namespace.batch):
+        parser.error("--vehicles cannot be used with -k, --symmetric, -g, -e or --batch")
+    if (namespace.export_matrix or namespace.import_matrix) and (namespace.neighbours or namespace.symmetric or namespace.progressive or namespace.decompose or namespace.batch):
+        parser.error("--export-matrix and --import-matrix need every duration and cannot be used with -k, --symmetric, --progressive, --decompose or --batch")
+    if namespace.import_matrix and (namespace.export_matrix or namespace.geometry or namespace.serve or namespace.client):
+        parser.error("--import-matrix cannot be used with --export-matrix, -g, --serve or --client")
+    return namespace
 
-def main(namespace, secret):
+def get_solver(namespace, size: int, events: EventEmitter =None, cancel=None):
+    if namespace.engine == "bnb":
+        return BranchBoundTSPSolver(verbose=namespace.verbose, time_limit=namespace.time_limit, events=events, cancel=cancel)
+    if namespace.engine == "parallel":
+        return ParallelTSPSolver(verbose=namespace.verbose, processes=namespace.processes, events=events, cancel=cancel)
+    if namespace.engine == "exact" or (namespace.engine == "auto" and size <= EXACT_SOLVER_LIMIT):
+        return TSPSolver(verbose=namespace.verbose, events=events, cancel=cancel)
+    return HeuristicTSPSolver(verbose=namespace.verbose, time_limit=namespace.time_limit, events=events, cancel=cancel)
 
-    api = NaverOpenAPI(API_ID, secret, verbose=namespace.verbose)
+def solve_with_estimates(solver, api: NaverOpenAPI, coordinates: list[str], duration_matrix: list[list[int]], estimated: set[tuple[int, int]], no_return: bool, end: int, tolerance: float =0):
+    """
+    Solve TSP while some of durations are only estimated.
 
-    start_address = DEFAULT_START_ADDRESS
+    Estimated legs of the solution are requested and the solution
+    gets their real durations. If that changes the total duration
+    by more than tolerance (relative), it is solved again.
+    """
+    while True:
+        solution = solver.solve(duration_matrix, no_return, end)
+        legs = [leg for leg in zip(solution.points, solution.points[1:]) if leg in estimated]
+        if not legs:
+            return solution
+        real_matrix = api.get_directions(*coordinates, duration_only=True, pairs=legs)
+        for i, j in legs:
+            duration_matrix[i][j] = real_matrix[i][j]
+            estimated.discard((i, j))
+        estimated_duration = solution.duration
+        solution.duration = sum(duration_matrix[i][j] for i, j in zip(solution.points, solution.points[1:]))
+        if abs(solution.duration - estimated_duration) <= tolerance*estimated_duration:
+            return solution
 
-    with open(namespace.file, "r", encoding="UTF-8") as file:
-        if namespace.set_start:
-            start_address = file.readline()
-        addresses = [start_address]
-        addresses_dump = file.read()
-        addresses = addresses + addresses_dump.split("\n")
+def get_solution_key(namespace, duration_matrix: DurationMatrix, end: int) -> str:
+    options = {"engine": namespace.engine, "no_return": namespace.no_return, "end": end, "time_limit": namespace.time_limit}
+    return sha256((duration_matrix.get_digest() + dumps(options, sort_keys=True)).encode()).hexdigest()
 
-    geocodes = api.get_geocodes(*addresses)
-    coordinates = [get_coordinate(geocode) for geocode in geocodes]
+def solve_memoized(namespace, solver, cache: RoptoCache, duration_matrix: DurationMatrix, end: int) -> tuple[Route, str]:
+    """
+    Solve or return the route solved before for the same durations and options.
 
-    equivalences = get_equivalences(coordinates)
-    unique_geocodes = remove_duplicates(geocodes, equivalences)
-    unique_coordinates = remove_duplicates(coordinates, equivalences) 
+    It returns the route and the name of the engine, which tells
+    when the route was kept in cache.
+    """
+    key = get_solution_key(namespace, duration_matrix, end) if cache else None
+    memo = cache.get_solution(key) if cache else None
+    if memo:
+        points, duration, engine_name = memo
+        return Route(points, duration), f"{engine_name} (저장된 결과)"
+    solution = solver.solve(duration_matrix, namespace.no_return, end)
+    if cache:
+        cache.set_solution(key, solution.points, solution.duration, solver.name)
+    return solution, solver.name
 
-    direction_matrix = api.get_directions(*unique_coordinates)
-    duration_matrix = [[get_duration(direction) for direction in directions] for directions in direction_matrix]
-    solver = TSPSolver(verbose=namespace.verbose)
-    solution = solver.solve(duration_matrix, namespace.no_return)
-    
-    if namespace.verbose == 1 or namespace.verbose == 2 or namespace.verbose == 3:
-        output = "계산결과\n\n"
-        output += unique_geocodes[0]["roadAddress"] + "\n"
-        previous_point = 0
-        for point in solution.points[1:]:
-            duration = duration_matrix[previous_point][point]
-            direction_time = Time(duration)
-            output += "v\t" + format(direction_time, "%h[ 시간 ]%m[ 분]") + "\n"
-            output += unique_geocodes[point]["roadAddress"] + "\n"
-            previous_point = point
-        total_time = Time(solution.duration)
-        output +="\n총 이동 시간:\t" + format(total_time, "%h[ 시간 ]%m[ 분]") + "\n"
+def write_geometry(path: str, api: NaverOpenAPI, coordinates: list[str], geocodes: list[dict], solution) -> None:
+    """
+    Request full routes only for the legs of the solution
+    and write them as a GeoJSON feature collection.
+    """
+    legs = list(zip(solution.points, solution.points[1:]))
+    direction_matrix = api.get_directions(*coordinates, pairs=legs)
+    features = []
+    for i, j in legs:
+        direction = direction_matrix[i][j]
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": direction["path"]},
+            "properties": {"start": geocodes[i]["roadAddress"], "goal": geocodes[j]["roadAddress"], "duration": direction["summary"]["duration"], "distance": direction["summary"]["distance"]}
+        })
+    with open(path, "w", encoding="UTF-8") as file:
+        dump({"type": "FeatureCollection", "features": features}, file, ensure_ascii=False)
+
+def get_api(namespace, secret, cache: RoptoCache =None, events: EventEmitter =None, cancel=None) -> NaverOpenAPI:
+    return NaverOpenAPI(API_ID, secret, verbose=namespace.verbose, workers=namespace.workers, rate_limit=namespace.rate_limit, cache=cache, retries=namespace.retries, url=namespace.api_url, events=events, cancel=cancel)
+
+def format_solution(geocodes: list[dict], duration_matrix, solution, engine_name: str) -> str:
+    output = "계산결과\n\n"
+    output += geocodes[0]["roadAddress"] + "\n"
+    previous_point = 0
+    for point in solution.points[1:]:
+        duration = duration_matrix[previous_point][point]
+        direction_time = Time(duration)
+        output += "v\t" + format(direction_time, "%h[ 시간 ]%m[ 분]") + "\n"
+        output += geocodes[point]["roadAddress"] + "\n"
+        previous_point = point
+    total_time = Time(solution.duration)
+    output +="\n총 이동 시간:\t" + format(total_time, "%h[ 시간 ]%m[ 분]") + "\n"
+    output += "계산 방식:\t" + engine_name + "\n"
+    return output
+
+def main(namespace, secret, events: EventEmitter =None, cancel=None):
+    """
+    Solve the address file of namespace and return the formatted result.
+
+    Progress of the run is emitted to events, or printed according to
+    verbose without them. Setting the cancel event stops the run with
+    RunCancelledError.
+    """
+    if events is None and namespace.progressive and namespace.verbose < 2:
+        # previews are printed even when progress is not
+        events = EventEmitter(ConsolePrinter(namespace.verbose))
+    events = get_emitter(namespace.verbose, events)
+    report = None
+    if namespace.report:
+        report = RunReport()
+        events.subscribe(report)
+    cache = None if namespace.no_cache else RoptoCache(namespace.cache, namespace.cache_ttl)
+    try:
+        if namespace.batch:
+            return solve_batch(namespace, secret, cache, events, cancel)
+        if namespace.import_matrix:
+            return solve_matrix_file(namespace, cache, events, cancel)
+        return solve_file(namespace, secret, cache, events, cancel)
+    finally:
+        if cache:
+            cache.close()
+        if report:
+            events.unsubscribe(report)
+            report.dump(namespace.report)
+
+def solve_file(namespace, secret, cache: RoptoCache, events: EventEmitter, cancel=None):
+
+    api = get_api(namespace, secret, cache, events, cancel)
+
+    with events.span("read"), open(namespace.file, "r", encoding="UTF-8") as file:
+        ingestion = Ingestion(file, namespace.set_start)
+
+    return solve_addresses(namespace, api, ingestion, events, cancel)
+
+def solve_matrix_file(namespace, cache: RoptoCache, events: EventEmitter, cancel=None) -> str:
+    """
+    Solve a file of --export-matrix with no api requests.
+    """
+    with events.span("read"):
+        duration_matrix, geocodes, _, last = read_matrix_file(namespace.import_matrix)
+
+    if namespace.vehicles > 1:
+        return solve_vehicles(namespace, geocodes, duration_matrix, events, cancel)
+    end = last if namespace.set_end else None
+    solver = get_solver(namespace, len(duration_matrix), events, cancel)
+    solution, engine_name = solve_memoized(namespace, solver, cache, duration_matrix, end)
+
+    return format_solution(geocodes, duration_matrix, solution, engine_name)
+
+def solve_addresses(namespace, api: NaverOpenAPI, ingestion: Ingestion, events: EventEmitter, cancel=None) -> str:
+
+    geocodes = api.get_geocodes(*ingestion.addresses)
+
+    with events.span("dedupe"):
+        ingestion.group_stops(geocodes)
+        unique_geocodes = ingestion.geocodes
+        unique_coordinates = ingestion.coordinates
+
+    end = ingestion.get_last_stop() if namespace.set_end else None
+    if namespace.progressive:
+        duration_matrix = DurationMatrix(len(unique_coordinates))
+        solver = get_solver(namespace, len(duration_matrix), events, cancel)
+        describe = lambda route, engine_name: format_solution(unique_geocodes, duration_matrix, route, engine_name)
+        solution = ProgressiveSolver(api, verbose=namespace.verbose, events=events, cancel=cancel).solve(unique_coordinates, duration_matrix, solver, namespace.no_return, end, describe)
+        if namespace.geometry:
+            write_geometry(namespace.geometry, api, unique_coordinates, unique_geocodes, solution)
+        return format_solution(unique_geocodes, duration_matrix, solution, solver.name)
+    # up to one cluster of stops is solved as a whole
+    if namespace.decompose and len(unique_coordinates) - 1 > namespace.cluster_size:
+        solution, leg_durations, engine_name = solve_clusters(namespace, api, unique_coordinates, end, events, cancel)
+        if namespace.geometry:
+            write_geometry(namespace.geometry, api, unique_coordinates, unique_geocodes, solution)
+        return format_solution(unique_geocodes, leg_durations, solution, engine_name)
+
+    pairs = None
+    if namespace.neighbours:
+        pairs = get_nearest_pairs(unique_coordinates, namespace.neighbours)
+    if namespace.symmetric:
+        pairs = [(i, j) for i, j in pairs or product(range(len(unique_coordinates)), repeat=2) if i < j]
+    duration_matrix = api.get_directions(*unique_coordinates, duration_only=True, pairs=pairs)
+    estimated = set()
+    if namespace.symmetric:
+        estimated |= mirror_durations(duration_matrix)
+    if namespace.neighbours:
+        estimated |= fill_estimates(duration_matrix, unique_coordinates, ESTIMATE_MS_PER_METER)
+    if namespace.export_matrix:
+        with events.span("export"):
+            write_matrix_file(namespace.export_matrix, duration_matrix, unique_geocodes, unique_coordinates, ingestion.get_last_stop())
+    if namespace.vehicles > 1:
+        return solve_vehicles(namespace, unique_geocodes, duration_matrix, events, cancel)
+    solver = get_solver(namespace, len(duration_matrix), events, cancel)
+    if estimated:
+        tolerance = namespace.symmetric_tolerance if namespace.symmetric else 0
+        solution = solve_with_estimates(solver, api, unique_coordinates, duration_matrix, estimated, namespace.no_return, end, tolerance)
+        engine_name = solver.name
+    else:
+        solution, engine_name = solve_memoized(namespace, solver, api.cache, duration_matrix, end)
+    if namespace.geometry:
+        write_geometry(namespace.geometry, api, unique_coordinates, unique_geocodes, solution)
     
+    return format_solution(unique_geocodes, duration_matrix, solution, engine_name)
+
+def get_batch_files(paths: list[str]) -> list[Path]:
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(file for file in path.glob("*.txt") if not file.name.endswith(BATCH_OUTPUT_SUFFIX)))
+        else:
+            files.append(path)
+    return files
+
+def solve_job(namespace, duration_matrix: DurationMatrix, end: int) -> tuple:
+    """
+    Solve one file of a batch in a worker process.
+    """
+    solver = get_solver(namespace, len(duration_matrix))
+    started = perf_counter()
+    solution = solver.solve(duration_matrix, namespace.no_return, end)
+    return solution, solver.name, perf_counter() - started
+
+def solve_jobs(namespace, jobs: list[tuple[DurationMatrix, int]], events: EventEmitter, cancel=None) -> list[tuple]:
+    """
+    Solve every (duration_matrix, end) of jobs on a pool of processes.
+    """
+    # workers only solve, progress of each job would interleave on the console
+    job_namespace = Namespace(**{**vars(namespace), "verbose": 1})
+    results = [None]*len(jobs)
+    events.emit(STAGE_START, "solve", 0, len(jobs))
+    with ProcessPoolExecutor(max_workers=max(1, namespace.processes)) as executor:
+        futures = {executor.submit(solve_job, job_namespace, duration_matrix, end): index for index, (duration_matrix, end) in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            if cancel and cancel.is_set():
+                for other in futures:
+                    other.cancel()
+                raise RunCancelledError("계산이 취소되었습니다.")
+            results[futures[future]] = future.result()
+            events.emit(ITEM_DONE, "solve", done, len(jobs))
+    events.emit(STAGE_END, "solve", len(jobs), len(jobs))
+    return results
+
+def solve_vehicles(namespace, geocodes: list[dict], duration_matrix: DurationMatrix, events: EventEmitter, cancel=None) -> str:
+    """
+    Split the points between namespace.vehicles vehicles and
+    solve the route of each vehicle on a pool of processes.
+    """
+    max_duration = round(namespace.max_duration*60_000) if namespace.max_duration else None
+    partitioner = VehicleRoutingSolver(namespace.vehicles, namespace.max_stops, max_duration, namespace.time_limit, namespace.verbose, events, cancel)
+    routes = partitioner.solve(duration_matrix, namespace.no_return)
+    route_points = [list(dict.fromkeys(route.points)) for route in routes]
+    results = solve_jobs(namespace, [(duration_matrix.submatrix(points), None) for points in route_points], events, cancel)
+
+    output = ""
+    total_duration = 0
+    for vehicle, (route, points, (solution, engine_name, _)) in enumerate(zip(routes, route_points, results), 1):
+        submatrix = duration_matrix.submatrix(points)
+        # the heuristic engine starts over and may miss the constructed order
+        if solution.duration > route.duration:
+            solution = Route([points.index(point) for point in route.points], route.duration)
+            engine_name = "savings"
+        output += f"차량 {vehicle}\n" + format_solution([geocodes[point] for point in points], submatrix, solution, engine_name) + "\n"
+        total_duration += solution.duration
+    output += f"차량 {len(routes)}대, 전체 이동 시간:\t" + format(Time(total_duration), "%h[ 시간 ]%m[ 분]") + "\n"
     return output
-        
+
+def solve_clusters(namespace, api: NaverOpenAPI, coordinates: list[str], end: int, events: EventEmitter, cancel=None) -> tuple[Route, dict, str]:
+    """
+    Solve by clusters of about namespace.cluster_size nearby points.
+
+    Clusters are ordered by their centroids, and for each pair of
+    consecutive clusters durations are requested only between the
+    points of either one nearest to the other. The cheapest of those
+    legs decides where the route leaves one cluster and enters the
+    next. Each cluster is then requested and solved on its own as a
+    path between them, so requests and memory grow with the number of
+    points times the cluster size. It returns the stitched route, the
+    durations of its legs by start and goal, and the engine name.
+    """
+    if len(coordinates) == 1:
+        return Route([0], 0), {}, "cluster-and-stitch (1 cluster)"
+    # an end at the point 0 closes the route, as in the solvers
+    fixed_end = end is not None and end != 0
+    others = [point for point in range(1, len(coordinates)) if point != end]
+    with events.span("cluster"):
+        clusters = [[0]] + get_clusters(coordinates, others, -(-len(others)//namespace.cluster_size), limit=namespace.cluster_size) + ([[end]] if fixed_end else [])
+        centroids = [get_centroid(coordinates, cluster) for cluster in clusters]
+        order = get_cluster_order(centroids, namespace.no_return, len(clusters) - 1 if fixed_end else end)
+
+    entries = {0: 0}
+    exits = {}
+    leg_durations = {}
+    with api:
+        for first, second in zip(order, order[1:]):
+            exit_candidates = get_candidates(coordinates, clusters[first], centroids[second], BOUNDARY_CANDIDATES)
+            entry_candidates = get_candidates(coordinates, clusters[second], centroids[first], BOUNDARY_CANDIDATES)
+            if len(clusters[first]) > 1:
+                exit_candidates = [point for point in exit_candidates if point != entries[first]]
+            boundary_matrix = api.get_directions(*(coordinates[point] for point in exit_candidates + entry_candidates), duration_only=True, pairs=list(product(range(len(exit_candidates)), range(len(exit_candidates), len(exit_candidates) + len(entry_candidates)))))
+            duration, i, j = min((boundary_matrix.get(i, j), i, j) for i, j in product(range(len(exit_candidates)), range(len(exit_candidates), len(exit_candidates) + len(entry_candidates))))
+            exits[first] = exit_candidates[i]
+            entries.setdefault(second, entry_candidates[j - len(exit_candidates)])
+            leg_durations.setdefault(exits[first], {})[entries[second]] = duration
+
+        # the last cluster of an open route may end anywhere
+        paths = []
+        jobs = []
+        for cluster in order[1:]:
+            if cluster == 0:
+                continue
+            entry, exit = entries[cluster], exits.get(cluster)
+            points = [entry] + [point for point in clusters[cluster] if point not in (entry, exit)] + ([exit] if exit not in (None, entry) else [])
+            paths.append(points)
+            jobs.append((api.get_directions(*(coordinates[point] for point in points), duration_only=True), len(points) - 1 if exit not in (None, entry) else None))
+    results = solve_jobs(Namespace(**{**vars(namespace), "no_return": True}), jobs, events, cancel)
+
+    route_points = [0]
+    route_duration = 0
+    for points, (duration_matrix, _), (solution, _, _) in zip(paths, jobs, results):
+        route_duration += leg_durations[route_points[-1]][points[0]]
+        for start, goal in zip(solution.points, solution.points[1:]):
+            leg_durations.setdefault(points[start], {})[points[goal]] = duration_matrix.get(start, goal)
+        route_points.extend(points[point] for point in solution.points)
+        route_duration += solution.duration
+    if order[-1] == 0:
+        route_duration += leg_durations[route_points[-1]][0]
+        route_points.append(0)
+    return Route(route_points, route_duration), leg_durations, f"cluster-and-stitch ({len(clusters)} clusters)"
+
+def solve_batch(namespace, secret, cache: RoptoCache, events: EventEmitter, cancel=None) -> str:
+    """
+    Solve every file of namespace.batch and return a summary table.
+
+    Addresses shared by files are geocoded once, and the durations
+    of all files are requested together so a pair of places shared
+    by files is requested once. The files are then solved on a pool
+    of processes and each result is written to its own file.
+    """
+    api = get_api(namespace, secret, cache, events, cancel)
+    files = get_batch_files(namespace.batch)
+
+    with events.span("read"):
+        jobs = []
+        for path in files:
+            with open(path, "r", encoding="UTF-8") as file:
+                jobs.append(Ingestion(file, namespace.set_start))
+
+    address_of_key = {}
+    for job in jobs:
+        for address in job.addresses:
+            address_of_key.setdefault(get_address_key(address), address)
+    geocode_of_key = dict(zip(address_of_key, api.get_geocodes(*address_of_key.values())))
+
+    with events.span("dedupe"):
+        coordinate_index = {}
+        job_points = []
+        job_ends = []
+        for job in jobs:
+            job.group_stops([geocode_of_key[get_address_key(address)] for address in job.addresses])
+            job_points.append([coordinate_index.setdefault(coordinate, len(coordinate_index)) for coordinate in job.coordinates])
+            job_ends.append(job.get_last_stop() if namespace.set_end else None)
+        coordinates = list(coordinate_index)
+        job_geocodes = [job.geocodes for job in jobs]
+        pairs = sorted({(i, j) for points in job_points for i, j in product(points, repeat=2) if i != j})
+
+    duration_matrix = api.get_directions(*coordinates, duration_only=True, pairs=pairs)
+
+    results = solve_jobs(namespace, [(duration_matrix.submatrix(points), end) for points, end in zip(job_points, job_ends)], events, cancel)
+
+    output = "일괄 계산결과\n\n"
+    output += "파일\t주소 수\t총 이동 시간\t계산 시간\t계산 방식\n"
+    for path, points, geocodes, (solution, engine_name, seconds) in zip(files, job_points, job_geocodes, results):
+        output_path = (Path(namespace.output_dir) if namespace.output_dir else path.parent)/(path.stem + BATCH_OUTPUT_SUFFIX)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "w", encoding="UTF-8") as file:
+            file.write(format_solution(geocodes, duration_matrix.submatrix(points), solution, engine_name))
+        output += f"{path.name}\t{len(points)}\t{format(Time(solution.duration), '%h[ 시간 ]%m[ 분]')}\t{seconds:.2f}초\t{engine_name}\n"
+    output += f"\n{len(files)}개 파일, 고유 주소 {len(coordinates)}개, 필요한 경로 {len(pairs)}개\n"
+    return output
+
+def serve(namespace, secret) -> None:
+    """
+    Run RoptoDaemon until interrupted.
+
+    The api keeps its connections open for the whole run, and the cache
+    stays open too, in memory with no_cache.
+    """
+    events = get_emitter(namespace.verbose)
+    cache = RoptoCache(":memory:" if namespace.no_cache else namespace.cache, namespace.cache_ttl)
+    api = get_api(namespace, secret, cache, events)
+    def solve(request: dict) -> str:
+        options = {key: value for key, value in request.get("options", {}).items() if key in ROUTE_OPTIONS}
+        route_namespace = Namespace(**{**vars(namespace), **options})
+        return solve_addresses(route_namespace, api, Ingestion(request["text"].split("\n"), route_namespace.set_start), events)
+    try:
+        with api, RoptoDaemon(solve, namespace.port) as server:
+            print(f"{server.url}에서 요청을 기다리는 중입니다. (종료: Ctrl+C)")
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cache.close()
+
 if __name__ == "__main__":
     namespace = get_namespace()
     if namespace.chpasswd:
@@ -95,6 +518,24 @@ if __name__ == "__main__":
         print("초기화에 성공하였습니다.")
         exit()
 
+    if namespace.client:
+        try:
+            with open(namespace.file, "r", encoding="UTF-8") as file:
+                text = file.read()
+            print("\n" + request_route({"text": text, "options": {key: getattr(namespace, key) for key in ROUTE_OPTIONS}}, namespace.port))
+        except RoptoError as err:
+            print("\n")
+            error("\t"+ err.__class__.__name__ + ":\t" + err.args[0])
+        exit()
+
+    if namespace.import_matrix:
+        try:
+            print("\n" + main(namespace, None))
+        except RoptoError as err:
+            print("\n")
+            error("\t"+ err.__class__.__name__ + ":\t" + err.args[0])
+        exit()
+
     for i in range(3):
         passwd = getpass("비밀번호: ")
         secret = decrypt(passwd)
@@ -103,6 +544,10 @@ if __name__ == "__main__":
     else:
         exit()
     
+    if namespace.serve:
+        serve(namespace, secret)
+        exit()
+
     try:
         print("\n" + main(namespace, secret))
     except RoptoError as err:
@@ -3,8 +3,17 @@
 # github.com/mrharrykim
 
 from tkinter import E, HORIZONTAL, N, W, S, StringVar, Tk, messagebox, ttk, Listbox, MULTIPLE, Message
-from ropto  import get_namespace, main
+from queue import Empty, Queue
+from threading import Event, Thread
+from ropto  import get_namespace, main, get_api, get_solver, format_solution
 from lib.security import decrypt
+from lib.cache import RoptoCache
+from lib.session import RouteSession
+from lib.ingest import NoAddressError
+from lib.utils import RunCancelledError
+from lib.events import EventEmitter, RoptoEvent, ITEM_DONE, STAGE_START, STAGE_END, PREVIEW
+from lib.progressive import ProgressiveSolver
+from config import DEFAULT_START_ADDRESS
 
 namespace = get_namespace()
 
@@ -77,6 +86,22 @@ def set_no_return():
 no_return_label = ttk.Label(entry_frame, text="시작 주소로 귀환하지 않음")
 no_return_checkbutton = ttk.Checkbutton(entry_frame, variable=no_return_var, onvalue="T", offvalue="F", command=set_no_return)
 
+set_end_var = StringVar(value="T" if namespace.set_end else False)
+
+def set_set_end():
+    namespace.set_end = True if set_end_var.get() == "T" else False
+
+set_end_label = ttk.Label(entry_frame, text="마지막 주소를 도착 주소로")
+set_end_checkbutton = ttk.Checkbutton(entry_frame, variable=set_end_var, onvalue="T", offvalue="F", command=set_set_end)
+
+progressive_var = StringVar(value="T" if namespace.progressive else False)
+
+def set_progressive():
+    namespace.progressive = True if progressive_var.get() == "T" else False
+
+progressive_label = ttk.Label(entry_frame, text="미리보기 경로 표시")
+progressive_checkbutton = ttk.Checkbutton(entry_frame, variable=progressive_var, onvalue="T", offvalue="F", command=set_progressive)
+
 seperator2 = ttk.Separator(entry_frame, orient=HORIZONTAL)
 
 verbose_var = StringVar(value=namespace.verbose)
@@ -94,7 +119,81 @@ output_message = Message(output_frame, textvariable=message, borderwidth=1, reli
 passwd_var = StringVar()
 password_entry = ttk.Entry(entry_frame, textvariable=passwd_var, show="*")
 
+# the pipeline runs on worker thread and talks to the window only through run_queue
+run_queue = Queue()
+cancel_event = Event()
+run_events = EventEmitter(run_queue.put)
+# geocodes, durations and the last route are kept between runs,
+# so a run after adding or removing addresses requests only what is new
+cache = None if namespace.no_cache else RoptoCache(namespace.cache, namespace.cache_ttl)
+session = None
+stage_names = {"geocode": "주소 검색", "direction": "경로 요청", "solve": "경로 계산", "preview": "미리보기"}
+
+progress_var = StringVar()
+progress_label = ttk.Label(output_frame, textvariable=progress_var)
+progressbar = ttk.Progressbar(output_frame, orient=HORIZONTAL, mode="determinate")
+
+def uses_main() -> bool:
+    """
+    Whether the options need a mode of ropto.main rather than the session.
+    """
+    return bool(namespace.vehicles > 1 or namespace.decompose or namespace.neighbours or namespace.symmetric or namespace.geometry or namespace.report or namespace.export_matrix or namespace.import_matrix or namespace.batch)
+
+def run_pipeline(secret):
+    global session
+    try:
+        if uses_main():
+            run_queue.put(("done", main(namespace, secret, run_events, cancel_event)))
+            return
+        if session is None or session.api.key != secret:
+            session = RouteSession(get_api(namespace, secret, cache, run_events, cancel_event))
+        addresses = [address for address in address_list if address.strip()]
+        if not namespace.set_start:
+            addresses.insert(0, DEFAULT_START_ADDRESS)
+        if not addresses:
+            raise NoAddressError("주소 파일에 주소가 없습니다.")
+        session.set_stops(addresses, fetch=not namespace.progressive)
+        end = session.get_index(addresses[-1]) if namespace.set_end else None
+        solver = get_solver(namespace, len(session.duration_matrix), run_events, cancel_event)
+        if namespace.progressive:
+            progressive = ProgressiveSolver(session.api, events=run_events, cancel=cancel_event)
+            describe = lambda route, engine_name: format_solution(session.stop_geocodes, session.duration_matrix, route, engine_name)
+            solution = session.solve(solver, namespace.no_return, end, progressive, describe)
+        else:
+            solution = session.solve(solver, namespace.no_return, end)
+        run_queue.put(("done", format_solution(session.stop_geocodes, session.duration_matrix, solution, solver.name)))
+    except Exception as err:
+        run_queue.put(("error", err))
+
+def poll_run_queue():
+    try:
+        while True:
+            item = run_queue.get_nowait()
+            if isinstance(item, RoptoEvent):
+                if item.kind == PREVIEW:
+                    message.set(item.data["output"])
+                if item.kind in (STAGE_START, ITEM_DONE, STAGE_END):
+                    progress_var.set(f"{stage_names.get(item.stage, item.stage)}: {item.done}/{item.total}" if item.total else stage_names.get(item.stage, item.stage))
+                    progressbar["maximum"] = max(item.total, 1)
+                    progressbar["value"] = item.done
+                continue
+            run_button.state(["!disabled"])
+            cancel_button.state(["disabled"])
+            if item[0] == "done":
+                progress_var.set("완료")
+                message.set(item[1])
+            elif isinstance(item[1], RunCancelledError):
+                progress_var.set("취소됨")
+            else:
+                progress_var.set("오류")
+                messagebox.showerror("계산 오류", f"{item[1].__class__.__name__}: {item[1]}")
+            return
+    except Empty:
+        root.after(100, poll_run_queue)
+
 def run_main():
+    if "disabled" in run_button.state():
+        return
     passwd = passwd_var.get()
     if len(passwd) == 0:
         messagebox.showwarning("입력 오류", "비밀번호를 입력하세요.")
@@ -106,13 +205,25 @@ def run_main():
         return
     with open(namespace.file, "w", encoding="UTF-8") as file:
         file.write("\n".join(address_list))
-    message.set(main(namespace, secret))
+    cancel_event.clear()
+    run_button.state(["disabled"])
+    cancel_button.state(["!disabled"])
+    progress_var.set("시작하는 중")
+    progressbar["value"] = 0
+    Thread(target=run_pipeline, args=(secret,), daemon=True).start()
+    root.after(100, poll_run_queue)
+
+def cancel_run():
+    cancel_event.set()
+    progress_var.set("취소하는 중")
 
 def handle_passwd_entry_event(e):
     run_main()
 
 password_entry.bind("<KeyRelease-Return>", handle_passwd_entry_event)
 run_button = ttk.Button(entry_frame, text="실행", command=run_main)
+cancel_button = ttk.Button(output_frame, text="취소", command=cancel_run)
+cancel_button.state(["disabled"])
 
 
 # geometry
@@ -151,15 +262,20 @@ set_start_label.grid(column=0, row=3, sticky=W)
 set_start_checkbutton.grid(column=1, row=3)
 no_return_label.grid(column=0, row=4, sticky=W)
 no_return_checkbutton.grid(column=1, row=4)
+set_end_label.grid(column=0, row=5, sticky=W)
+set_end_checkbutton.grid(column=1, row=5)
+
+progressive_label.grid(column=0, row=6, sticky=W)
+progressive_checkbutton.grid(column=1, row=6)
 
-seperator2.grid(column=0, columnspan=2, row=5, pady=5, sticky=(N, E, S, W))
+seperator2.grid(column=0, columnspan=2, row=7, pady=5, sticky=(N, E, S, W))
 
-verbose_label.grid(column=0, row=6, sticky=W)
-verbose_spinbox.grid(column=1, row=6, padx=(5, 0))
+verbose_label.grid(column=0, row=8, sticky=W)
+verbose_spinbox.grid(column=1, row=8, padx=(5, 0))
 verbose_spinbox["width"] = 3
 
-password_entry.grid(column=0, row=7, pady=(5, 0))
-run_button.grid(column=1, row=7, padx=(5, 0), pady=(5, 0))
+password_entry.grid(column=0, row=9, pady=(5, 0))
+run_button.grid(column=1, row=9, padx=(5, 0), pady=(5, 0))
 run_button["width"] = 5
 
 main_frame.columnconfigure(1, weight=1)
@@ -168,7 +284,18 @@ output_frame["padding"] = (0, 10, 10, 10)
 
 output_frame.columnconfigure(0, weight=1)
 output_frame.rowconfigure(0, weight=1)
-output_message.grid(column=0, row=0, sticky=(N, E, S, W))
+output_message.grid(column=0, columnspan=2, row=0, sticky=(N, E, S, W))
+progress_label.grid(column=0, columnspan=2, row=1, pady=(5, 0), sticky=W)
+progressbar.grid(column=0, row=2, sticky=(E, W))
+cancel_button.grid(column=1, row=2, padx=(5, 0))
+cancel_button["width"] = 5
+
+def close_window():
+    if cache:
+        cache.close()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", close_window)
 
 # debug
 # entry_frame["borderwidth"] = 2
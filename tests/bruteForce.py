@@ -0,0 +1,46 @@
+from itertools import permutations
+from random import Random
+
+def get_random_matrix(size: int, seed: int) -> list[list[int]]:
+    random = Random(seed)
+    return [[0 if i == j else random.randint(1, 1000) for j in range(size)] for i in range(size)]
+
+def get_modes(size: int) -> list[tuple[bool, int]]:
+    """
+    (no_return, end) of a closed, an open and a fixed-end route.
+    """
+    modes = [(False, None), (True, None)]
+    if size > 1:
+        modes.append((True, size - 1))
+    return modes
+
+def get_route_duration(matrix: list[list[int]], points: list[int]) -> int:
+    return sum(matrix[i][j] for i, j in zip(points, points[1:]))
+
+def get_shortest_duration(matrix: list[list[int]], no_return: bool, end: int =None) -> int:
+    """
+    Shortest route from the point 0 by trying every order.
+    """
+    size = len(matrix)
+    closed = end == 0 or (end is None and not no_return)
+    through = [point for point in range(1, size) if point != end]
+    durations = []
+    for order in permutations(through):
+        points = [0, *order] + ([end] if end else []) + ([0] if closed and size > 1 else [])
+        durations.append(get_route_duration(matrix, points))
+    return min(durations)
+
+def check_route(matrix: list[list[int]], no_return: bool, end: int, route) -> None:
+    """
+    Assert that route visits every point once in the mode and has its duration.
+    """
+    size = len(matrix)
+    closed = end == 0 or (end is None and not no_return)
+    points = route.points[:-1] if closed and size > 1 else route.points
+    assert points[0] == 0
+    assert sorted(points) == list(range(size))
+    if closed and size > 1:
+        assert route.points[-1] == 0
+    if end:
+        assert route.points[-1] == end
+    assert route.duration == get_route_duration(matrix, route.points)
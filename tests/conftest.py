@@ -0,0 +1,5 @@
+from os.path import dirname
+from sys import path
+
+# lib and config are imported from the repository root
+path.insert(0, dirname(dirname(__file__)))
@@ -0,0 +1,36 @@
+from itertools import permutations
+from random import Random
+from lib.branchBoundTSP import BranchBoundTSPSolver, solve_assignment, get_cycles
+from bruteForce import get_random_matrix, get_modes, get_shortest_duration, check_route
+
+def test_assignment_matches_brute_force():
+    for seed in range(30):
+        random = Random(seed)
+        size = seed % 6 + 1
+        costs = [[random.randint(0, 100) for _ in range(size)] for _ in range(size)]
+        total, assignment = solve_assignment(costs)
+        assert sorted(assignment) == list(range(size))
+        assert total == sum(costs[i][assignment[i]] for i in range(size))
+        assert total == min(sum(costs[i][columns[i]] for i in range(size)) for columns in permutations(range(size)))
+
+def test_cycles():
+    assert get_cycles([1, 0, 3, 4, 2]) == [[0, 1], [2, 3, 4]]
+    assert get_cycles([0]) == [[0]]
+
+def test_branch_and_bound_matches_brute_force():
+    for seed in range(40):
+        size = seed % 8 + 1
+        matrix = get_random_matrix(size, seed)
+        for no_return, end in get_modes(size):
+            solver = BranchBoundTSPSolver(time_limit=10)
+            route = solver.solve(matrix, no_return, end)
+            check_route(matrix, no_return, end, route)
+            assert route.duration == get_shortest_duration(matrix, no_return, end)
+            assert solver.gap == 0
+
+def test_gap_name_is_reset():
+    solver = BranchBoundTSPSolver(time_limit=0.05)
+    solver.solve(get_random_matrix(120, 1), False)
+    assert solver.gap > 0 and solver.name != BranchBoundTSPSolver.name
+    solver.solve(get_random_matrix(5, 1), False)
+    assert solver.name == BranchBoundTSPSolver.name
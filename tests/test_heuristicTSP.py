@@ -0,0 +1,24 @@
+from lib.heuristicTSP import HeuristicTSPSolver
+from lib.solveTSP import TSPSolver
+from bruteForce import get_random_matrix, get_modes, get_shortest_duration, check_route
+
+def test_small_routes_are_optimal():
+    for seed in range(40):
+        size = seed % 8 + 1
+        matrix = get_random_matrix(size, seed)
+        for no_return, end in get_modes(size):
+            route = HeuristicTSPSolver(time_limit=0.05, seed=0).solve(matrix, no_return, end)
+            check_route(matrix, no_return, end, route)
+            assert route.duration == get_shortest_duration(matrix, no_return, end)
+
+def test_large_routes_are_valid_and_close():
+    matrix = get_random_matrix(16, 0)
+    for no_return, end in get_modes(16):
+        route = HeuristicTSPSolver(time_limit=0.2, seed=0).solve(matrix, no_return, end)
+        check_route(matrix, no_return, end, route)
+        assert route.duration <= TSPSolver().solve(matrix, no_return, end).duration*1.1
+
+def test_warm_start_inserts_missing_points():
+    matrix = get_random_matrix(20, 1)
+    route = HeuristicTSPSolver(time_limit=0.1, seed=0).solve(matrix, False, initial=[0, 5, 3, 9, 0])
+    check_route(matrix, False, None, route)
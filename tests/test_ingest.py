@@ -0,0 +1,28 @@
+from pytest import raises
+from lib.ingest import Ingestion, NoAddressError, get_address_key
+from config import DEFAULT_START_ADDRESS
+
+def get_geocode(x: str, y: str) -> dict:
+    return {"roadAddress": f"{x},{y}", "x": x, "y": y}
+
+def test_address_key():
+    assert get_address_key("원주시  지니기길 11-20") == get_address_key("지니기길 11-20")
+    assert get_address_key("강원도 원주시 지니기길 11-20") == "지니기길 11-20"
+    assert get_address_key("원주시") == "원주시"
+
+def test_duplicate_lines_are_geocoded_once():
+    ingestion = Ingestion(["단구로 1", "", "원주시 단구로 1", "명륜로 2 ", "단구로 1"], False)
+    assert ingestion.addresses == [DEFAULT_START_ADDRESS, "단구로 1", "명륜로 2"]
+    assert ingestion.address_of_line == {0: 0, 1: 1, 3: 1, 4: 2, 5: 1}
+
+def test_same_coordinates_are_one_stop():
+    ingestion = Ingestion(["단구로 1", "단구로 1-1", "명륜로 2"], True)
+    ingestion.group_stops([get_geocode("1", "2"), get_geocode("1", "2"), get_geocode("3", "4")])
+    assert ingestion.coordinates == ["1,2", "3,4"]
+    assert ingestion.stop_of_address == [0, 0, 1]
+    assert ingestion.get_stop(2) == 0
+    assert ingestion.get_last_stop() == 1
+
+def test_no_address():
+    with raises(NoAddressError):
+        Ingestion(["", "  "], True)
@@ -0,0 +1,57 @@
+from array import array
+from json import load
+from pytest import raises
+from lib.matrix import DurationMatrix
+from lib.matrixFile import MatrixFileError, write_matrix_file, read_matrix_file, get_sidecar_path
+from lib.cache import RoptoCache
+from bruteForce import get_random_matrix
+
+def get_matrix(size: int) -> DurationMatrix:
+    return DurationMatrix.from_list([[None if i == j else duration for j, duration in enumerate(row)] for i, row in enumerate(get_random_matrix(size, 0))])
+
+def test_round_trip(tmp_path):
+    matrix = get_matrix(5)
+    geocodes = [{"roadAddress": f"주소 {i}", "x": str(i), "y": "0"} for i in range(5)]
+    coordinates = [f"{i},0" for i in range(5)]
+    path = str(tmp_path/"matrix.npy")
+    write_matrix_file(path, matrix, geocodes, coordinates, 3)
+    read, read_geocodes, read_coordinates, last = read_matrix_file(path)
+    assert read.to_list() == matrix.to_list()
+    assert (read_geocodes, read_coordinates, last) == (geocodes, coordinates, 3)
+    assert read.get_digest() == matrix.get_digest()
+
+def test_npy_header(tmp_path):
+    path = str(tmp_path/"matrix.npy")
+    write_matrix_file(path, get_matrix(3), [{}]*3, ["0,0"]*3, 0)
+    with open(path, "rb") as file:
+        data = file.read()
+    header_length = int.from_bytes(data[8:10], "little")
+    assert data[:8] == b"\x93NUMPY\x01\x00"
+    assert (10 + header_length) % 64 == 0
+    assert b"'descr': '<i4'" in data[10:10 + header_length]
+    assert len(data) == 10 + header_length + 3*3*4
+    with open(get_sidecar_path(path), encoding="UTF-8") as file:
+        assert load(file)["last"] == 0
+
+def test_not_a_matrix_file(tmp_path):
+    path = str(tmp_path/"matrix.npy")
+    with raises(MatrixFileError):
+        read_matrix_file(path)
+    write_matrix_file(path, get_matrix(3), [{}]*3, ["0,0"]*3, 0)
+    with open(path, "r+b") as file:
+        file.write(b"NOTNPY")
+    with raises(MatrixFileError):
+        read_matrix_file(path)
+
+def test_digest_ignores_array_type():
+    matrix = get_matrix(4)
+    assert DurationMatrix(4, array("i", matrix.durations)).get_digest() == matrix.get_digest()
+    matrix.set(1, 2, matrix.get(1, 2) + 1)
+    assert DurationMatrix(4, array("i", get_matrix(4).durations)).get_digest() != matrix.get_digest()
+
+def test_solutions_are_cached():
+    cache = RoptoCache(":memory:")
+    assert cache.get_solution("key") is None
+    cache.set_solution("key", [0, 2, 1, 0], 42, "engine")
+    assert cache.get_solution("key") == ([0, 2, 1, 0], 42, "engine")
+    cache.close()
@@ -0,0 +1,23 @@
+from pytest import raises
+from lib.parallelTSP import ParallelTSPSolver
+from lib.solveTSP import TableTooLargeError
+from bruteForce import get_random_matrix, get_modes, get_shortest_duration, check_route
+
+def test_parallel_matches_brute_force():
+    for seed in range(16):
+        size = seed % 8 + 1
+        matrix = get_random_matrix(size, seed)
+        for no_return, end in get_modes(size):
+            route = ParallelTSPSolver(processes=2).solve(matrix, no_return, end)
+            check_route(matrix, no_return, end, route)
+            assert route.duration == get_shortest_duration(matrix, no_return, end)
+
+def test_table_limit():
+    with raises(TableTooLargeError):
+        ParallelTSPSolver(processes=2, table_limit=2**10).solve(get_random_matrix(12, 0), False)
+
+def test_durations_over_32_bits():
+    matrix = get_random_matrix(4, 0)
+    matrix[1][2] = 2**31
+    with raises(TableTooLargeError):
+        ParallelTSPSolver(processes=2).solve(matrix, False)
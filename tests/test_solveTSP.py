@@ -0,0 +1,20 @@
+from pytest import raises
+from lib.solveTSP import TSPSolver, TableTooLargeError
+from bruteForce import get_random_matrix, get_modes, get_shortest_duration, check_route
+
+def test_held_karp_matches_brute_force():
+    for seed in range(40):
+        size = seed % 8 + 1
+        matrix = get_random_matrix(size, seed)
+        for no_return, end in get_modes(size):
+            route = TSPSolver().solve(matrix, no_return, end)
+            check_route(matrix, no_return, end, route)
+            assert route.duration == get_shortest_duration(matrix, no_return, end)
+
+def test_end_at_start_is_closed():
+    matrix = get_random_matrix(6, 0)
+    assert TSPSolver().solve(matrix, True, 0).duration == TSPSolver().solve(matrix, False).duration
+
+def test_table_limit():
+    with raises(TableTooLargeError):
+        TSPSolver(table_limit=2**20).solve(get_random_matrix(30, 0), False)